@@ -0,0 +1,184 @@
+import fcntl
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from Pipeline import *
+
+
+# Requests over these limits are downgraded, or rejected if that is not enough
+MAX_MEMORY_MB = float(os.environ.get("OPTIMIZER_MAX_MEMORY_MB", 2048))
+MAX_SECONDS = float(os.environ.get("OPTIMIZER_MAX_SECONDS", 120))
+# Memory every worker or island process costs before it packs anything
+PROCESS_MEMORY_MB = float(os.environ.get("OPTIMIZER_PROCESS_MEMORY_MB", 60))
+# Rough cost of placing one item during a fitness evaluation, per placement strategy
+SECONDS_PER_PLACEMENT = {
+    "candidates": float(os.environ.get("OPTIMIZER_CANDIDATES_SECONDS_PER_PLACEMENT", 2e-4)),
+    "extreme_points": float(os.environ.get("OPTIMIZER_EXTREME_POINTS_SECONDS_PER_PLACEMENT", 1e-4)),
+}
+# Rough cost of checking one position in the candidates strategy's fallback scan,
+# per occupancy backend. An evaluation ending on an item that fits nowhere scans
+# every position the item could take, so the candidates strategy is replaced
+# once one such scan would take over MAX_SCAN_SECONDS
+SECONDS_PER_SCANNED_POSITION = {
+    "dense": float(os.environ.get("OPTIMIZER_DENSE_SECONDS_PER_SCANNED_POSITION", 4e-6)),
+    "sparse": float(os.environ.get("OPTIMIZER_SPARSE_SECONDS_PER_SCANNED_POSITION", 8e-6)),
+    "summed_volume": float(os.environ.get("OPTIMIZER_SUMMED_VOLUME_SECONDS_PER_SCANNED_POSITION", 1e-7)),
+}
+MAX_SCAN_SECONDS = float(os.environ.get("OPTIMIZER_MAX_SCAN_SECONDS", 1))
+
+# Size classes by estimated seconds, each with its own concurrency limit across
+# all server processes and how many seconds a request queues for a free slot.
+# A queued request holds its server thread, so only small requests, which free
+# their slots quickly, queue by default and bigger ones are refused at once;
+# jobs of any size queue in the job worker instead
+SIZE_CLASSES = (
+    ("small", 5, int(os.environ.get("OPTIMIZER_SMALL_SLOTS", 4)),
+     float(os.environ.get("OPTIMIZER_SMALL_QUEUE_TIMEOUT", 5))),
+    ("medium", 60, int(os.environ.get("OPTIMIZER_MEDIUM_SLOTS", 2)),
+     float(os.environ.get("OPTIMIZER_MEDIUM_QUEUE_TIMEOUT", 0))),
+    ("large", float("inf"), int(os.environ.get("OPTIMIZER_LARGE_SLOTS", 1)),
+     float(os.environ.get("OPTIMIZER_LARGE_QUEUE_TIMEOUT", 0))),
+)
+ADMISSION_DIR = os.environ.get(
+    "OPTIMIZER_ADMISSION_DIR", os.path.join(tempfile.gettempdir(), "optimizer-admission"))
+
+
+class AdmissionError(RequestError):
+    """A request refused because of its estimated cost or a full queue."""
+
+    def __init__(self, message, status, estimate, retry_after=None):
+        super().__init__(message, status)
+        self.estimate = estimate
+        self.retry_after = retry_after
+
+
+def estimate_cost(container, items, config):
+    """Estimate the memory and time a validated request needs, before running it."""
+    w, h, d = container["width"], container["height"], container["depth"]
+    processes = max(min(int(config.get("workers", 1) or 1), os.cpu_count() or 1),
+                    config.get("islands", 1))
+
+    # Every process holds the container plus one being packed, and maybe snapshots
+    occupancy = config.get("occupancy", "dense")
+    if occupancy == "dense":
+        container_bytes = w * h * d
+    elif occupancy == "summed_volume":
+        container_bytes = 4 * (w + 1) * (h + 1) * (d + 1)
+    else:
+        container_bytes = 48 * len(items)
+    memory = (2 * container_bytes + PROCESS_MEMORY_MB * 1024 * 1024) * processes
+    if config.get("incremental"):
+        memory += int(config.get("snapshot_memory_mb", 64)) * 1024 * 1024 * processes
+
+    per_generation = config["population_size"]
+    if config.get("local_search"):
+        per_generation += int(config.get("local_search_evaluations", 30))
+    evaluations = per_generation * config["generations"] * config.get("islands", 1)
+    if config.get("max_evaluations") is not None:
+        evaluations = min(evaluations, int(config["max_evaluations"]))
+    placement = config.get("placement", "candidates")
+    per_evaluation = len(items) * SECONDS_PER_PLACEMENT.get(placement, 2e-4)
+    if placement == "candidates":
+        # Evaluations end on such a scan more often the fuller the load; the
+        # fourth power of the fill matches measured evaluation times
+        items_volume = sum(item["dimensions"]["width"] * item["dimensions"]["height"] *
+                           item["dimensions"]["depth"] for item in items)
+        fill = min(1, items_volume / (w * h * d))
+        per_evaluation += fill ** 4 * scan_seconds(container, items, config)
+    # Processes beyond the number of cores do not run in parallel
+    parallel = min(processes, os.cpu_count() or 1)
+    seconds = evaluations * per_evaluation / parallel
+    if config.get("time_limit_ms") is not None:
+        seconds = min(seconds, float(config["time_limit_ms"]) / 1000)
+
+    size_class = next(name for name, max_seconds, _, _ in SIZE_CLASSES if seconds <= max_seconds)
+    return {
+        "items": len(items),
+        "container_volume": w * h * d,
+        "evaluations": evaluations,
+        "memory_mb": round(memory / 2 ** 20, 1),
+        "seconds": round(seconds, 2),
+        "size_class": size_class
+    }
+
+
+def scan_seconds(container, items, config):
+    """Estimate the seconds the candidates strategy takes to scan for an item that fits nowhere."""
+    w, h, d = container["width"], container["height"], container["depth"]
+    positions = sum(max(0, w - item["dimensions"]["width"] + 1) *
+                    max(0, h - item["dimensions"]["height"] + 1) *
+                    max(0, d - item["dimensions"]["depth"] + 1) for item in items) / max(1, len(items))
+    return positions * SECONDS_PER_SCANNED_POSITION.get(config.get("occupancy", "dense"), 8e-6)
+
+
+def admit(container, items, config):
+    """Downgrade a request over the limits, or raise AdmissionError.
+
+    Too much memory first switches the occupancy grid to the sparse backend and
+    drops prefix snapshots, which do not change the result. A container too big
+    for the candidates strategy's fallback scan, which visits every position,
+    gets extreme point placement. Too much time caps the run with a time limit.
+    Returns the final estimate and the downgrades.
+    """
+    downgrades = []
+    estimate = estimate_cost(container, items, config)
+    if estimate["memory_mb"] > MAX_MEMORY_MB and config.get("occupancy", "dense") != "sparse":
+        config["occupancy"] = "sparse"
+        downgrades.append("occupancy=sparse")
+        estimate = estimate_cost(container, items, config)
+    if estimate["memory_mb"] > MAX_MEMORY_MB and config.get("incremental"):
+        config["incremental"] = False
+        downgrades.append("incremental=false")
+        estimate = estimate_cost(container, items, config)
+    if estimate["memory_mb"] > MAX_MEMORY_MB:
+        raise AdmissionError(f"Estimated memory {estimate['memory_mb']} MB exceeds the "
+                             f"{MAX_MEMORY_MB:g} MB limit", 413, estimate)
+
+    if (config.get("placement", "candidates") == "candidates"
+            and scan_seconds(container, items, config) > MAX_SCAN_SECONDS):
+        config["placement"] = "extreme_points"
+        downgrades.append("placement=extreme_points")
+        estimate = estimate_cost(container, items, config)
+
+    if estimate["seconds"] > MAX_SECONDS:
+        config["time_limit_ms"] = MAX_SECONDS * 1000
+        downgrades.append(f"time_limit_ms={MAX_SECONDS * 1000:g}")
+        estimate = estimate_cost(container, items, config)
+    return estimate, downgrades
+
+
+@contextmanager
+def size_class_slot(estimate, timeout=None, directory=ADMISSION_DIR):
+    """Hold a slot of the estimate's size class for the enclosed block, waiting up to timeout.
+
+    timeout defaults to the queue timeout of the size class. Slots are lock
+    files shared by all processes; the lock is released when the block ends or
+    its process dies.
+    """
+    size_class = estimate["size_class"]
+    limit, queue_timeout = next((slots, queue_timeout) for name, _, slots, queue_timeout
+                                in SIZE_CLASSES if name == size_class)
+    if timeout is None:
+        timeout = queue_timeout
+    os.makedirs(directory, exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        for slot in range(limit):
+            lock = open(os.path.join(directory, f"{size_class}-{slot}.lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                lock.close()
+            return
+        if time.time() >= deadline:
+            # A slot should free up about when a running request of this size ends
+            raise AdmissionError(f"Too many {size_class} requests in progress", 429, estimate,
+                                 retry_after=max(1, round(estimate["seconds"])))
+        time.sleep(0.05)
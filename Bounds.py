@@ -0,0 +1,26 @@
+def usable_length(length, sides):
+    """Largest sum of the given sides, each used any number of times, that is at most length.
+
+    Items lined up along an axis can fill at most this much of it, so the
+    container is effectively no longer than this along that axis.
+    """
+    mask = (1 << (length + 1)) - 1
+    reachable = 1  # Bit i is set when a sum of i can be made
+    for side in set(sides):
+        # Adding side, 2 * side, 4 * side, ... reaches every multiple of side
+        step = side
+        while 0 < step <= length:
+            reachable |= (reachable << step) & mask
+            step *= 2
+    return reachable.bit_length() - 1
+
+
+def volume_upper_bound(w, h, d, items):
+    """Upper bound on the item volume any arrangement of items can place in a w x h x d container."""
+    # Only orientations that fit the empty container can ever be used
+    orientations = [[o for o in item.orientations if o[0] <= w and o[1] <= h and o[2] <= d]
+                    for item in items]
+    placeable = [item.volume for item, fitting in zip(items, orientations) if fitting]
+    usable = [usable_length(length, [o[axis] for fitting in orientations for o in fitting])
+              for axis, length in enumerate((w, h, d))]
+    return min(sum(placeable), usable[0] * usable[1] * usable[2])
@@ -0,0 +1,75 @@
+import base64
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Listed in requirements.txt; the json module is the slower fallback
+    orjson = None
+
+
+# Response formats for placements, by name and media type. Requests pick one
+# with an Accept header or config.response_format; JSON lists are the default.
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "columnar": "application/vnd.optimizer.columnar+json",
+    "packed": "application/vnd.optimizer.packed+json",
+}
+COLUMNS = ("x", "y", "z", "width", "height", "depth")
+
+
+def loads(body):
+    """Parse a JSON document from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(obj):
+    """Serialize obj as compact JSON bytes."""
+    if orjson is not None:
+        # Numpy values, e.g. in stats, are serialized natively
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def response_format(accepted, config):
+    """Pick a format by name: one of the media types accepted, else config.response_format."""
+    accepted = set(accepted)
+    for name in ("columnar", "packed"):
+        if RESPONSE_FORMATS[name] in accepted:
+            return name
+    return (config or {}).get("response_format") or "json"
+
+
+def encode_placements(placements, format):
+    """Encode [id, x, y, z, w, h, d] placements in the named response format.
+
+    columnar gives one array per field. packed gives the ids plus a base64
+    buffer of (x, y, z, w, h, d) rows, one per placement, as little-endian
+    unsigned integers of the smallest width that holds every value.
+    """
+    if format == "json":
+        return placements
+    columns = [list(column) for column in zip(*placements)] or [[] for _ in range(7)]
+    if format == "columnar":
+        return dict(zip(("id",) + COLUMNS, columns))
+
+    boxes = np.array(columns[1:], dtype=np.int64).T
+    largest = int(boxes.max(initial=0))
+    dtype = "<u1" if largest < 2 ** 8 else "<u2" if largest < 2 ** 16 else "<u4"
+    return {
+        "id": columns[0],
+        "columns": list(COLUMNS),
+        "dtype": dtype,
+        "shape": list(boxes.shape),
+        "data": base64.b64encode(boxes.astype(dtype).tobytes()).decode()
+    }
+
+
+def encode_result(result, format):
+    """Return result with its placements, if any, in the named response format."""
+    if format == "json" or "placements" not in result:
+        return result
+    return dict(result, placements=encode_placements(result["placements"], format),
+                placements_format=format)
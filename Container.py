@@ -17,11 +17,30 @@ class Container:
         # Check if space is already occupied using numpy's any() - much faster than nested loops
         return not np.any(self.space[x:x+w, y:y+h, z:z+d])
 
+    def first_fit(self, positions, w, h, d):
+        """Return the index of the first (x, y, z) row of positions where the item fits, or None"""
+        for i, (x, y, z) in enumerate(positions.tolist()):
+            if self.fits(x, y, z, w, h, d):
+                return i
+        return None
+
     def place_item(self, item, x, y, z, w, h, d):
         """Place an item and update space using array slicing"""
         self.space[x:x+w, y:y+h, z:z+d] = 1
         self.placements.append((item.id, x, y, z, w, h, d))
 
+    def copy(self):
+        """Return an independent copy of this container"""
+        clone = Container.__new__(Container)
+        clone.w, clone.h, clone.d = self.w, self.h, self.d
+        clone.placements = list(self.placements)
+        clone.space = self.space.copy()
+        return clone
+
+    def nbytes(self):
+        """Approximate memory held by this container, in bytes"""
+        return self.space.nbytes + 64 * len(self.placements)
+
     def get_utilization(self):
         total_volume = self.w * self.h * self.d
         used_volume = np.sum(self.space)
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+
+class FitnessCache:
+    """Bounded LRU cache of fitness results keyed on an arrangement's genes."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(arrangement):
+        """Canonical encoding of an arrangement as its (item id, orientation) sequence."""
+        # Items sharing an id and orientation place identically, so the id is enough
+        return tuple((item.id, orientation) for item, orientation in arrangement)
+
+    def get(self, key):
+        """Return the cached result for a key, or None if it is not cached."""
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        # Evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
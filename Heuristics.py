@@ -0,0 +1,58 @@
+def first_fit_decreasing(optimizer):
+    """Largest items first, each laid flat on its smallest side."""
+    items = sorted(optimizer.items, key=lambda item: item.volume, reverse=True)
+    return [(item, min(item.orientations, key=lambda o: (o[2], -o[0], -o[1])))
+            for item in items]
+
+
+def wall_building(optimizer):
+    """Largest items first, each turned so it adds as little as possible along x.
+
+    Positions are filled lowest x first, so this builds the load up in thin
+    walls across the container.
+    """
+    items = sorted(optimizer.items, key=lambda item: item.volume, reverse=True)
+    return [(item, min(item.orientations, key=lambda o: (o[0], -o[1], -o[2])))
+            for item in items]
+
+
+def best_fit(optimizer):
+    """Largest items first, each in the orientation that can be placed lowest.
+
+    Evaluating the arrangement stops at the first item that fits nowhere, so
+    the search stops there too and leaves the rest in their first orientation.
+    It also stops once the run's budget is exhausted, as a failed search can
+    scan the whole container for every orientation.
+    """
+    placement = optimizer.empty_placement()
+    arrangement = []
+    items = sorted(optimizer.items, key=lambda item: item.volume, reverse=True)
+
+    for index, item in enumerate(items):
+        best = None
+        for w, h, d in item.orientations:
+            if optimizer.budget_exhausted():
+                break
+            position = placement.find_position(w, h, d)
+            if position is None:
+                continue
+            # Lowest position first, then the thinnest along x
+            key = (position, w)
+            if best is None or key < best[0]:
+                best = (key, position, (w, h, d))
+
+        if best is None:
+            return arrangement + [(rest, rest.orientations[0]) for rest in items[index:]]
+        _, (x, y, z), (w, h, d) = best
+        placement.place_item(item, x, y, z, w, h, d)
+        arrangement.append((item, (w, h, d)))
+
+    return arrangement
+
+
+# Deterministic constructive heuristics, tried in order before the GA
+HEURISTICS = {
+    "first_fit_decreasing": first_fit_decreasing,
+    "wall_building": wall_building,
+    "best_fit": best_fit,
+}
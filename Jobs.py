@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, nullcontext
+from Admission import *
+
+
+# Job state lives in a SQLite file so every server worker process sees it
+JOBS_DB = os.environ.get(
+    "OPTIMIZER_JOBS_DB", os.path.join(tempfile.gettempdir(), "optimizer-jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("OPTIMIZER_JOB_WORKERS", 2))
+JOB_TTL = int(os.environ.get("OPTIMIZER_JOB_TTL", 24 * 3600))
+# Running jobs refresh their updated time every JOB_HEARTBEAT seconds; one not
+# refreshed for JOB_STALE_AFTER seconds lost its worker process and has failed
+JOB_HEARTBEAT = float(os.environ.get("OPTIMIZER_JOB_HEARTBEAT", 10))
+JOB_STALE_AFTER = float(os.environ.get("OPTIMIZER_JOB_STALE_AFTER", 300))
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    best TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobStore:
+    """Optimization jobs, their progress events and cancellation flags."""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        with closing(self.connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def create(self, job_request):
+        """Queue a validated request and return its job id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self.connect()) as db, db:
+            # Forget finished jobs past their time to live
+            expired = "SELECT id FROM jobs WHERE updated < ? AND status IN (?, ?, ?)"
+            db.execute(f"DELETE FROM job_events WHERE job_id IN ({expired})",
+                       (now - JOB_TTL, *FINISHED_STATUSES))
+            db.execute(f"DELETE FROM jobs WHERE id IN ({expired})",
+                       (now - JOB_TTL, *FINISHED_STATUSES))
+            db.execute("INSERT INTO jobs (id, status, request, created, updated) "
+                       "VALUES (?, 'queued', ?, ?, ?)",
+                       (job_id, json.dumps(job_request), now, now))
+        return job_id
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if it does not exist."""
+        with closing(self.connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("request", "best", "result"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def start(self, job_id):
+        """Mark a queued job as running; False if it was cancelled meanwhile."""
+        with closing(self.connect()) as db, db:
+            started = db.execute(
+                "UPDATE jobs SET status = 'running', updated = ? "
+                "WHERE id = ? AND status = 'queued' AND cancel_requested = 0",
+                (time.time(), job_id)).rowcount
+        return started == 1
+
+    def finish(self, job_id, status, result=None, error=None):
+        with closing(self.connect()) as db, db:
+            db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                       (status, None if result is None else json.dumps(result), error,
+                        time.time(), job_id))
+
+    def add_event(self, job_id, update):
+        """Record a progress update, keeping any new best placements on the job."""
+        update = dict(update)
+        placements = update.pop("placements", None)
+        now = time.time()
+        with closing(self.connect()) as db, db:
+            db.execute("INSERT INTO job_events (job_id, seq, data) SELECT ?, "
+                       "COALESCE(MAX(seq), 0) + 1, ? FROM job_events WHERE job_id = ?",
+                       (job_id, json.dumps(update), job_id))
+            if placements is not None:
+                best = {"space_utilization": update["best_utilization"], "placements": placements}
+                db.execute("UPDATE jobs SET best = ?, updated = ? WHERE id = ?",
+                           (json.dumps(best), now, job_id))
+
+    def events_since(self, job_id, seq):
+        """Return the (seq, data) progress events recorded after seq."""
+        with closing(self.connect()) as db:
+            rows = db.execute("SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? "
+                              "ORDER BY seq", (job_id, seq)).fetchall()
+        return [(row["seq"], row["data"]) for row in rows]
+
+    def request_cancel(self, job_id):
+        """Ask a job to stop; a job that has not started is cancelled right away."""
+        with closing(self.connect()) as db, db:
+            now = time.time()
+            db.execute("UPDATE jobs SET status = 'cancelled', updated = ? "
+                       "WHERE id = ? AND status = 'queued'", (now, job_id))
+            db.execute("UPDATE jobs SET cancel_requested = 1, updated = ? "
+                       "WHERE id = ? AND status = 'running'", (now, job_id))
+
+    def heartbeat(self, job_id):
+        """Show that a running job's worker is still alive."""
+        with closing(self.connect()) as db, db:
+            db.execute("UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'",
+                       (time.time(), job_id))
+
+    def recover(self, stale_after=JOB_STALE_AFTER):
+        """Fail running jobs whose worker is gone and return the ids of queued jobs.
+
+        Queues live in the memory of server processes, so jobs queued by a
+        process that was killed or recycled must be submitted again. Submitting
+        one twice is harmless: only the first start() succeeds.
+        """
+        now = time.time()
+        with closing(self.connect()) as db, db:
+            db.execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? "
+                       "WHERE status = 'running' AND updated < ?",
+                       ("The worker running this job stopped", now, now - stale_after))
+            rows = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created").fetchall()
+        return [row["id"] for row in rows]
+
+    def cancel_requested(self, job_id):
+        with closing(self.connect()) as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row["cancel_requested"])
+
+
+_executor = None
+
+
+def submit_job(store, job_id):
+    """Run a queued job on this process's local worker pool."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(JOB_WORKERS)
+    future = _executor.submit(run_job, store.path, job_id)
+
+    def mark_crashed(future):
+        # run_job records its own failures, so this only sees a broken pool
+        if not future.cancelled() and future.exception() is not None:
+            store.finish(job_id, "failed", error=str(future.exception()))
+    future.add_done_callback(mark_crashed)
+
+
+def run_job(path, job_id, poll_interval=0.25):
+    """Worker entry point: run one job once its size class has a free slot."""
+    store = JobStore(path)
+    # Jobs stay queued until their size class has a free slot
+    estimate = store.get(job_id)["request"].get("estimate")
+    with size_class_slot(estimate, timeout=float("inf")) if estimate else nullcontext():
+        if store.start(job_id):
+            execute_job(store, job_id, poll_interval)
+
+
+def execute_job(store, job_id, poll_interval):
+    """Run a started job, streaming progress into the store."""
+    last_poll = [0.0]
+    last_heartbeat = [time.time()]
+
+    def should_stop():
+        # Cancellation is cooperative; poll the store at most every poll_interval
+        now = time.time()
+        if now - last_poll[0] < poll_interval:
+            return False
+        last_poll[0] = now
+        if now - last_heartbeat[0] >= JOB_HEARTBEAT:
+            last_heartbeat[0] = now
+            store.heartbeat(job_id)
+        return store.cancel_requested(job_id)
+
+    try:
+        container, items, config = parse_request(store.get(job_id)["request"])
+        result = run_optimization(container, items, config,
+                                  progress=lambda update: store.add_event(job_id, update),
+                                  should_stop=should_stop)
+    except Exception as e:
+        store.finish(job_id, "failed", error=str(e))
+        return
+
+    status = "cancelled" if result["stats"]["stop_reason"] == "cancelled" else "done"
+    store.finish(job_id, status, result)
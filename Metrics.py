@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+
+# Metrics are summed in a SQLite file so /metrics covers every worker process
+METRICS_DB = os.environ.get(
+    "OPTIMIZER_METRICS_DB", os.path.join(tempfile.gettempdir(), "optimizer-metrics.sqlite3"))
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "optimizer_request_seconds": (
+        "histogram", "HTTP request latency in seconds.",
+        (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)),
+    "optimizer_runs_total": ("counter", "Optimizer runs by stop reason.", None),
+    "optimizer_generations": (
+        "histogram", "Generations run per optimization.", (0, 1, 5, 10, 20, 50, 100, 200, 500)),
+    "optimizer_generations_total": ("counter", "Generations run.", None),
+    "optimizer_fitness_evaluations_total": ("counter", "Fitness evaluations.", None),
+    "optimizer_fits_checks_total": ("counter", "Positions checked for whether an item fits.", None),
+    "optimizer_phase_seconds_total": ("counter", "Time spent per optimizer phase in seconds.", None),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+
+def format_labels(labels, le=None):
+    """Format labels for exposition; a histogram bucket's le label always comes last."""
+    pairs = sorted(labels.items()) + ([] if le is None else [("le", le)])
+    return ",".join(f'{key}="{value}"' for key, value in pairs)
+
+
+def exposition_order(row):
+    """Sort key keeping each series' histogram buckets in increasing le order."""
+    name, labels, _ = row
+    series, _, le = labels.partition('le="')
+    return name, series, float(le.rstrip('"')) if le else 0.0
+
+
+class MetricsStore:
+    """Counters and histograms shared by all processes, in Prometheus text format."""
+
+    def __init__(self, path=METRICS_DB):
+        self.path = path
+        with closing(self.connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, counters=(), observations=()):
+        """Add (name, labels, amount) counter increments and (name, labels, value) histogram observations."""
+        rows = [(name, format_labels(labels), amount) for name, labels, amount in counters]
+        for name, labels, value in observations:
+            # Histogram buckets are cumulative, as Prometheus expects
+            for bound in METRICS[name][2]:
+                if value <= bound:
+                    rows.append((name + "_bucket", format_labels(labels, le=bound), 1))
+            rows.append((name + "_bucket", format_labels(labels, le="+Inf"), 1))
+            rows.append((name + "_sum", format_labels(labels), value))
+            rows.append((name + "_count", format_labels(labels), 1))
+        with closing(self.connect()) as db, db:
+            db.executemany("INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+                           "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                           rows)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with closing(self.connect()) as db:
+            rows = db.execute("SELECT name, labels, value FROM metrics").fetchall()
+        rows.sort(key=exposition_order)
+        lines = []
+        for family, (kind, help_text, _) in METRICS.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            names = ([family + "_bucket", family + "_sum", family + "_count"]
+                     if kind == "histogram" else [family])
+            for name, labels, value in rows:
+                if name in names:
+                    lines.append(f"{name}{{{labels}}} {value:.15g}" if labels else f"{name} {value:.15g}")
+        return "\n".join(lines) + "\n"
+
+
+_store = None
+
+
+def default_store():
+    """Return this process's store for the shared metrics file."""
+    global _store
+    if _store is None:
+        _store = MetricsStore()
+    return _store
+
+
+def record_run(result, profile):
+    """Record the outcome and hot-path profile of one optimizer run."""
+    stats = result["stats"]
+    counters = [
+        ("optimizer_runs_total", {"stop_reason": stats["stop_reason"]}, 1),
+        ("optimizer_generations_total", {}, stats["generations"]),
+        ("optimizer_fitness_evaluations_total", {}, stats["evaluations"]),
+        ("optimizer_fits_checks_total", {}, profile.counts.get("fits_checks", 0)),
+    ]
+    counters += [("optimizer_phase_seconds_total", {"phase": phase}, seconds)
+                 for phase, seconds in profile.timings.items()]
+    try:
+        default_store().record(counters, [("optimizer_generations", {}, stats["generations"])])
+    except sqlite3.Error as e:
+        # Losing a sample is better than failing the request
+        print(f"Could not record metrics: {e}")
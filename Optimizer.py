@@ -1,204 +1,539 @@
+import atexit
+import itertools
+import math
+import multiprocessing
+import os
+import pickle
+import queue
 import random
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+import numpy as np
+from Bounds import *
 from Container import *
+from FitnessCache import *
+from Heuristics import *
 from Item import *
+from Placement import *
+from Population import *
+from Profile import *
+from SnapshotTrie import *
+from SparseContainer import *
+from SummedVolumeContainer import *
+
+
+# Occupancy models that can back a container, selected with config.occupancy
+OCCUPANCY_BACKENDS = {
+    "dense": Container,
+    "sparse": SparseContainer,
+    "summed_volume": SummedVolumeContainer,
+}
 
 
 class Optimizer:
-    def __init__(self, container_data, items_data):
+    def __init__(self, container_data, items_data, config=None, progress=None, should_stop=None,
+                 fixed=()):
+        config = config or {}
+        # Optional callbacks: progress receives a dict per generation, and a
+        # true should_stop() ends the run early with the best packing so far
+        self.progress = progress
+        self.should_stop = should_stop
+        # Kept so worker processes can rebuild an identical optimizer
+        self.container_data, self.items_data, self.config = container_data, items_data, config
+        self.random = random.Random(config.get("seed"))
+        # Vectorized genetic operators draw from a generator seeded off self.random
+        self.rng = np.random.default_rng(self.random.getrandbits(64))
+
+        # How occupied space is tracked while items are placed
+        self.occupancy = config.get("occupancy", "dense")
+        if self.occupancy not in OCCUPANCY_BACKENDS:
+            raise ValueError(f"Unknown occupancy backend: {self.occupancy}")
+
         # Convert to Container and Item objects
         w, h, d = container_data["width"], container_data["height"], container_data["depth"]
-        self.container = Container(w, h, d)
+        self.container = OCCUPANCY_BACKENDS[self.occupancy](w, h, d)
+
+        # Boxes already in the container as (id, x, y, z, w, h, d); they stay where
+        # they are and every packing starts around them. Only run_repack passes
+        # them, after checking they are inside the container and do not overlap
+        self.fixed = [tuple(box) for box in fixed]
+        self.fixed_volume = sum(box[4] * box[5] * box[6] for box in self.fixed)
+        self.base_placement = None
 
+        # Identical boxes share one Item per type, whose id is the type index;
+        # self.items repeats it once per box and request ids are restored in assign_ids
+        self.types = []
+        self.type_ids = []
+        type_index = {}
         self.items = []
         for item_data in items_data:
             item_id = item_data.get("id")
             w, h, d = item_data["dimensions"]["width"], item_data["dimensions"]["height"], item_data["dimensions"]["depth"]
 
-            self.items.append(Item(item_id, w, h, d))
-        
-    def initialize_population(self, size, items):
+            dims = tuple(sorted((w, h, d)))
+            if dims not in type_index:
+                type_index[dims] = len(self.types)
+                self.types.append(Item(len(self.types), w, h, d))
+                self.type_ids.append([])
+            self.type_ids[type_index[dims]].append(item_id)
+            self.items.append(self.types[type_index[dims]])
+
+        # How candidate positions are generated for each item
+        self.placement = config.get("placement", "candidates")
+        if self.placement not in PLACEMENT_STRATEGIES:
+            raise ValueError(f"Unknown placement strategy: {self.placement}")
+        # Free spaces thinner than the smallest item side can never be used
+        self.min_item_size = min((min(item.orientations[0]) for item in self.items), default=1)
+
+        # No arrangement can reach a higher utilization, so reaching it ends the run
+        container_volume = self.container.w * self.container.h * self.container.d
+        if self.fixed_volume + sum(item.volume for item in self.items) > container_volume:
+            # fitness scores every arrangement of an oversized load as 0
+            self.upper_bound = 0.0
+        elif self.fixed:
+            # Fixed boxes break up the axes, so only the volume itself bounds the rest
+            self.upper_bound = (self.fixed_volume + sum(item.volume for item in self.items)) / container_volume * 100
+        else:
+            self.upper_bound = volume_upper_bound(
+                self.container.w, self.container.h, self.container.d, self.items) / container_volume * 100
+
+        # Constructive heuristics give a fast path and seed the initial population
+        self.heuristics = bool(config.get("heuristics", True))
+
+        # Fitness results are cached per run, keyed on the arrangement
+        self.cache_size = config.get("cache_size", 1024)
+        self.fitness_cache = FitnessCache(self.cache_size)
+
+        # Incremental evaluation resumes arrangements from snapshots of shared prefixes
+        self.incremental = bool(config.get("incremental", False))
+        self.snapshot_interval = max(1, int(config.get("snapshot_interval", 4)))
+        self.snapshot_memory = int(config.get("snapshot_memory_mb", 64)) * 1024 * 1024
+        self.snapshots = None
+        # Copying the dense grid costs O(w * h * d), far more than placing its boxes
+        # again, so its snapshots keep the placements and rebuild the grid on resume
+        self.replay_snapshots = self.occupancy == "dense"
+
+        # Worker processes for parallel population evaluation (1 = serial)
+        self.workers = max(1, min(int(config.get("workers", 1) or 1), os.cpu_count() or 1))
+        self.pool = None
+
+        # Anytime budget: stop between evaluations once either limit is reached;
+        # an evaluation still running at the time limit is abandoned
+        time_limit_ms = config.get("time_limit_ms")
+        max_evaluations = config.get("max_evaluations")
+        self.time_limit = None if time_limit_ms is None else float(time_limit_ms) / 1000
+        self.max_evaluations = None if max_evaluations is None else int(max_evaluations)
+        self.deadline = None
+        self.evaluations = 0
+        self.interrupted = None
+
+        # Memetic local search: hill-climb the elites every generation, spending up
+        # to local_search_evaluations evaluations per generation on them
+        self.local_search = bool(config.get("local_search", False))
+        self.local_search_evaluations = max(1, int(config.get("local_search_evaluations", 30)))
+        self.search_snapshots = None
+        self.search_evaluations = 0
+        self.search_improvements = 0
+
+        # Time per phase and hot-path counts; config.profile adds them to the result
+        self.profile = Profile()
+        self.report_profile = bool(config.get("profile", False))
+
+    def initialize_population(self, size, items, seeds=()):
         """Generate an initial population of random solutions with smarter initialization."""
-        population = []
+        # Heuristic arrangements take the first places
+        population = [list(seed) for seed in seeds][:size]
 
         # Sort items by volume for better initial packing (largest first)
         sorted_items = sorted(
             items, key=lambda item: item.volume, reverse=True)
 
-        for _ in range(size):
+        for _ in range(size - len(population)):
             # Create different permutations - some ordered by size, some random
-            if random.random() < 0.3:  # 30% completely random
-                random.shuffle(items)
-                item_list = items
-            elif random.random() < 0.7:  # 40% sorted by volume
+            if self.random.random() < 0.3:  # 30% completely random
+                item_list = items.copy()
+                self.random.shuffle(item_list)
+            elif self.random.random() < 0.7:  # 40% sorted by volume
                 item_list = sorted_items.copy()
             else:  # 30% slightly shuffled sorted
                 item_list = sorted_items.copy()
                 # Swap a few items to introduce variety
                 for _ in range(len(item_list) // 3):
-                    i, j = random.sample(range(len(item_list)), 2)
+                    i, j = self.random.sample(range(len(item_list)), 2)
                     item_list[i], item_list[j] = item_list[j], item_list[i]
 
-            orientations = [random.choice(item.orientations)
+            orientations = [self.random.choice(item.orientations)
                             for item in item_list]
             population.append(list(zip(item_list, orientations)))
 
-        return population
+        return Population.from_arrangements(self.items, population)
+
+    def new_placement(self, container):
+        """Create the placement strategy selected for this optimizer."""
+        if self.placement == "extreme_points":
+            return ExtremePointPlacement(container, self.min_item_size, self.profile)
+        return CandidatePlacement(container, self.profile, self.past_deadline)
+
+    def empty_placement(self):
+        """Create the selected placement strategy over a new container holding only the fixed boxes."""
+        if not self.fixed:
+            return self.new_placement(OCCUPANCY_BACKENDS[self.occupancy](
+                self.container.w, self.container.h, self.container.d))
+
+        # Fixed boxes are placed once and copied, so each packing costs only its own items
+        if self.base_placement is None:
+            placement = self.new_placement(OCCUPANCY_BACKENDS[self.occupancy](
+                self.container.w, self.container.h, self.container.d))
+            for box_id, x, y, z, w, h, d in self.fixed:
+                placement.place_item(Item(box_id, w, h, d), x, y, z, w, h, d)
+            self.base_placement = placement
+        return self.base_placement.copy()
+
+    def construct(self):
+        """Evaluate the constructive heuristics until one of them places every item.
+
+        Returns a (name, arrangement, fitness result) tuple per heuristic tried.
+        """
+        constructed = []
+        if not self.heuristics:
+            return constructed
+        for name, heuristic in HEURISTICS.items():
+            if self.budget_exhausted():
+                break
+            arrangement = heuristic(self)
+            # A search cut short by the budget is not worth replaying
+            if self.budget_exhausted():
+                break
+            result = self.evaluate(arrangement)
+            if result is None:
+                break
+            constructed.append((name, arrangement, result))
+            if result[2]:
+                break
+        return constructed
 
     def fitness(self, container, arrangement):
-        """Evaluate the fitness of a packing arrangement with early stopping."""
+        """Evaluate the fitness of a packing arrangement with early stopping.
+
+        Returns None if the time limit passes before the evaluation is done.
+        """
 
         all_placed = False
-        temp_container = Container(container.w, container.h, container.d)
         total_volume = container.w * container.h * container.d
-        total_items_volume = sum(item.volume for item, _ in arrangement)
+        total_items_volume = self.fixed_volume + sum(item.volume for item, _ in arrangement)
 
         # If total items volume is too large, fail early
         if total_items_volume > total_volume:
             return 0, [], all_placed
 
-        placements = []
-        total_placed_volume = 0
-
-        for item, (w, h, d) in arrangement:
-            placed = False
-
-            # Try to place the item at lowest coordinates first (bottom-left-front strategy)
-            candidates = []
-
-            # First try corners and edges where items are already placed
-            # Start with (0,0,0) as the first candidate
-            candidates.append((0, 0, 0))
-
-            # Add positions that are adjacent to already placed items
-            for _, px, py, pz, pw, ph, pd in placements:
-                # Add positions adjacent to placed items (6 surfaces)
-                candidates.extend([
-                    (px + pw, py, pz),  # Right surface
-                    (px, py + ph, pz),  # Back surface
-                    (px, py, pz + pd),  # Top surface
-                ])
-
-            # Remove duplicates and out-of-bounds positions
-            candidates = [(x, y, z) for x, y, z in candidates if
-                        x < container.w - w + 1 and
-                        y < container.h - h + 1 and
-                        z < container.d - d + 1]
-
-            # Try candidate positions first (much fewer than all positions)
-            for x, y, z in candidates:
-                if temp_container.fits(x, y, z, w, h, d):
-                    temp_container.place_item(item, x, y, z, w, h, d)
-                    placements.append((item.id, x, y, z, w, h, d))
-                    placed = True
-                    total_placed_volume += item.volume
-                    break
+        # Resume from the longest previously evaluated prefix, if any
+        start = 0
+        if self.snapshots is not None:
+            genes = FitnessCache.key(arrangement)
+            start, snapshot = self.snapshots.longest_prefix(genes)
 
-            # If no candidate positions work, try a subset of all positions
-            if not placed:
-                # Sample a subset of positions for efficiency
-                step = max(1, min(container.w, container.h, container.d) // 4)
-                for x in range(0, container.w - w + 1, step):
-                    for y in range(0, container.h - h + 1, step):
-                        for z in range(0, container.d - d + 1, step):
-                            if temp_container.fits(x, y, z, w, h, d):
-                                temp_container.place_item(item, x, y, z, w, h, d)
-                                placements.append((item.id, x, y, z, w, h, d))
-                                placed = True
-                                total_placed_volume += item.volume
-                                break
-                        if placed:
-                            break
-                    if placed:
-                        break
+        if start:
+            state, total_placed_volume = snapshot
+            placement = self.restore(state)
+            # The container also lists the fixed boxes, which come first
+            placements = placement.container.placements[len(self.fixed):]
+        else:
+            placement = self.empty_placement()
+            placements = []
+            total_placed_volume = self.fixed_volume
 
-                # If step sampling didn't work, try all positions
-                if not placed and step > 1:
-                    for x in range(0, container.w - w + 1):
-                        for y in range(0, container.h - h + 1):
-                            for z in range(0, container.d - d + 1):
-                                if temp_container.fits(x, y, z, w, h, d):
-                                    temp_container.place_item(item, x, y, z, w, h, d)
-                                    placements.append((item.id, x, y, z, w, h, d))
-                                    placed = True
-                                    total_placed_volume += item.volume
-                                    break
-                            if placed:
-                                break
-                        if placed:
-                            break
-
-            # If still not placed, return failure
-            if not placed:
+        for index in range(start, len(arrangement)):
+            # Evaluations still running at the deadline are abandoned
+            if self.past_deadline():
+                return None
+            item, (w, h, d) = arrangement[index]
+            position = placement.find_position(w, h, d)
+
+            # If the item cannot be placed anywhere, return failure
+            if position is None:
+                # Unless the placement gave up scanning at the deadline
+                if self.past_deadline():
+                    return None
                 utilization = (total_placed_volume / total_volume) * 100
                 return utilization, placements, all_placed
 
+            x, y, z = position
+            placement.place_item(item, x, y, z, w, h, d)
+            placements.append((item.id, x, y, z, w, h, d))
+            total_placed_volume += item.volume
+
+            # Snapshot the state so arrangements sharing this prefix can resume here
+            depth = index + 1
+            if (self.snapshots is not None and depth < len(arrangement)
+                    and depth % self.snapshot_interval == 0):
+                state, size = self.snapshot(placement)
+                if state is not None:
+                    self.snapshots.insert(genes[:depth], (state, total_placed_volume), size)
+
         all_placed = True
         utilization = (total_placed_volume / total_volume) * 100
         return utilization, placements, all_placed
 
 
-    def tournament_selection(self, evaluated_population, tournament_size=3):
-        """Select parents using tournament selection."""
-        selected = []
-        for _ in range(2):
-            tournament = random.sample(evaluated_population, tournament_size)
-            winner = max(tournament, key=lambda x: x[0][0])
-            selected.append(winner[1])
-        return selected
+    def snapshot(self, placement):
+        """Return a (state, size in bytes) snapshot of a placement for the snapshot trie.
+
+        The state is None if it would not fit in the trie's memory cap.
+        """
+        if self.replay_snapshots:
+            placements = tuple(placement.container.placements[len(self.fixed):])
+            return placements, 64 * len(placements)
+        size = placement.nbytes()
+        if size > self.snapshots.max_bytes:
+            return None, size
+        return placement.copy(), size
+
+    def restore(self, state):
+        """Return a new placement in the state a snapshot was taken in."""
+        if not self.replay_snapshots:
+            return state.copy()
+        placement = self.empty_placement()
+        for type_index, x, y, z, w, h, d in state:
+            placement.place_item(self.types[type_index], x, y, z, w, h, d)
+        return placement
+
+    def evaluate(self, arrangement):
+        """Evaluate an arrangement, reusing the cached result for repeated genomes.
 
-    def crossover(self, parent1, parent2):
-        """Perform order-based crossover between two parents."""
-        # Choose a random segment to preserve from parent1
-        start = random.randint(0, len(parent1) - 1)
-        end = random.randint(start + 1, len(parent1))
+        Returns None, and caches nothing, if the evaluation was abandoned at the deadline.
+        """
+        key = FitnessCache.key(arrangement)
+        result = self.fitness_cache.get(key)
+        if result is None:
+            result = self.fitness(self.container, arrangement)
+            if result is None:
+                return None
+            self.fitness_cache.put(key, result)
+            self.evaluations += 1
+        return result
 
-        # Create a mapping of items from parent2 to their indices
-        parent2_items = {item[0].id: i for i, item in enumerate(parent2)}
+    def start_budget(self):
+        """Start the clock for the time limit and reset the evaluation count."""
+        self.deadline = None if self.time_limit is None else time.time() + self.time_limit
+        self.evaluations = 0
+        self.interrupted = None
+        self.search_evaluations = 0
+        self.search_improvements = 0
 
-        # Create child with segment from parent1
-        child_segment = parent1[start:end]
+    def past_deadline(self):
+        """Check the time limit alone, cheaply enough to call between placements."""
+        return self.deadline is not None and time.time() >= self.deadline
 
-        # Fill the rest of the child with items from parent2 in their original order
-        remaining_items = [item for item in parent2 if item[0]
-                           not in [seg[0] for seg in child_segment]]
+    def budget_exhausted(self):
+        """Check the time limit, evaluation limit and cancellation, recording why the run must stop."""
+        if self.interrupted is None:
+            if self.deadline is not None and time.time() >= self.deadline:
+                self.interrupted = "time_limit"
+            elif self.max_evaluations is not None and self.evaluations >= self.max_evaluations:
+                self.interrupted = "max_evaluations"
+            elif self.should_stop is not None and self.should_stop():
+                self.interrupted = "cancelled"
+        return self.interrupted is not None
 
-        child = remaining_items[:start] + \
-            child_segment + remaining_items[start:]
+    def encode(self, arrangement):
+        """Encode an arrangement as compact (type index, orientation index) pairs."""
+        return [(item.id, item.orientations.index(orientation))
+                for item, orientation in arrangement]
 
-        return child
+    def decode(self, genome):
+        """Rebuild an arrangement from its (type index, orientation index) pairs."""
+        return [(self.types[i], self.types[i].orientations[k]) for i, k in genome]
 
-    def mutate(self, arrangement):
-        """Apply multiple types of mutations."""
-        if random.random() < 0.3:  # Swap mutation
-            i, j = random.sample(range(len(arrangement)), 2)
-            arrangement[i], arrangement[j] = arrangement[j], arrangement[i]
+    @contextmanager
+    def worker_pool(self):
+        """Run the enclosed block with the shared process pool for evaluation, if configured."""
+        if self.workers <= 1:
+            yield
+            return
+        self.pool = _shared_pool(self.workers)
+        # Tasks carry this run's request, which workers build an optimizer from once
+        self.run_key = uuid.uuid4().hex
+        self.run_payload = pickle.dumps((self.container_data, self.items_data, self.config, self.fixed))
+        try:
+            yield
+        finally:
+            self.pool = None
 
-        if random.random() < 0.3:  # Orientation mutation
-            i = random.randint(0, len(arrangement) - 1)
-            item, _ = arrangement[i]
-            arrangement[i] = (item, random.choice(item.orientations))
+    def evaluate_population(self, population):
+        """Evaluate a generation, fanning uncached arrangements out to the worker pool.
 
-        if random.random() < 0.2:  # Rotation mutation - rotate a random segment
-            if len(arrangement) > 3:
-                start = random.randint(0, len(arrangement) - 3)
-                end = random.randint(
-                    start + 2, min(len(arrangement), start + 5))
-                segment = arrangement[start:end]
-                segment.reverse()
-                arrangement[start:end] = segment
+        Results line up with population; individuals left unevaluated because the
+        budget ran out get None.
+        """
+        if self.pool is None:
+            results = []
+            for individual in population:
+                if self.budget_exhausted():
+                    break
+                results.append(self.evaluate(individual))
+            return results + [None] * (len(population) - len(results))
+
+        keys = [FitnessCache.key(individual) for individual in population]
+        results, pending = {}, {}
+        for key, individual in zip(keys, population):
+            if key in results or key in pending:
+                # Serial evaluation would find this repeat in the cache
+                self.fitness_cache.hits += 1
+                continue
+            cached = self.fitness_cache.get(key)
+            if cached is None:
+                pending[key] = self.encode(individual)
+            else:
+                results[key] = cached
+
+        # One genome per task so results can be awaited with a timeout. Tasks are
+        # handed out two per worker at a time, so a run that stops early leaves
+        # no more than that behind in the shared pool
+        tasks = iter([(self.run_key, self.run_payload, self.deadline, genome)
+                      for genome in pending.values()])
+        in_flight = deque(self.pool.apply_async(_evaluate_genome, (task,))
+                          for task in itertools.islice(tasks, 2 * self.workers))
+        for key in pending:
+            if self.budget_exhausted():
+                break
+            try:
+                timeout = None if self.deadline is None else max(0, self.deadline - time.time())
+                result, profile = in_flight.popleft().get(timeout)
+            except multiprocessing.TimeoutError:
+                result = None
+            if result is None:
+                # Workers abandon evaluations, and skip tasks, once the deadline has passed
+                self.interrupted = "time_limit"
+                break
+            for task in itertools.islice(tasks, 1):
+                in_flight.append(self.pool.apply_async(_evaluate_genome, (task,)))
+            self.profile.merge(profile)
+            self.fitness_cache.put(key, result)
+            self.evaluations += 1
+            results[key] = result
+        return [results.get(key) for key in keys]
+
+    def breed(self, population, fitness, population_size, stagnation_counter,
+              crossover_rate=0.7, mutation_rate=0.2):
+        """Build the next generation from evaluated individuals and their fitness."""
+        fitness = np.asarray(fitness)
+        # Elitism - keep top solutions
+        elite_count = max(1, population_size // 10)
+        elites = population.take(np.argsort(-fitness, kind="stable")[:elite_count])
+        count = max(0, population_size - elite_count)
+
+        # Tournament selection
+        parents1 = population.tournament(fitness, count, 3, self.rng)
+        parents2 = population.tournament(fitness, count, 3, self.rng)
 
-        return arrangement
+        # Crossover, or copy one of the parents unchanged
+        crossed = self.rng.random(count) < crossover_rate
+        copied = np.where(self.rng.random(count) < 0.5, parents1, parents2)[~crossed]
+        children = population.crossover(parents1[crossed], parents2[crossed], self.rng).join(
+            population.take(copied))
+
+        # Mutation (adaptive rate)
+        # Increase mutation as stagnation increases
+        children.mutate(self.rng.random(count) < mutation_rate + (stagnation_counter / 20),
+                        self.rng)
+
+        return elites.join(children)
+
+    def improve(self, arrangement, result, budget):
+        """Hill-climb from an evaluated arrangement with swap, insert and orientation moves.
+
+        Half the moves involve the first box that did not fit, where a change
+        is most likely to help. Each move is evaluated from the prefix snapshot
+        closest before the first position it changes instead of from scratch.
+        Returns the best (arrangement, result) found.
+        """
+        n = len(arrangement)
+        for _ in range(budget):
+            fitness_value, placements, all_placed = result
+            if all_placed or self.budget_exhausted():
+                break
+            i = len(placements) if self.random.random() < 0.5 else self.random.randrange(n)
+            j = self.random.randrange(n)
+            move = self.random.choice(("swap", "insert", "orientation"))
+
+            candidate = list(arrangement)
+            if move == "swap":
+                candidate[i], candidate[j] = candidate[j], candidate[i]
+            elif move == "insert":
+                candidate.insert(j, candidate.pop(i))
+            else:
+                item, _ = candidate[i]
+                candidate[i] = (item, self.random.choice(item.orientations))
+            # Moving a box among identical ones changes nothing
+            if candidate == arrangement:
+                continue
+
+            self.search_evaluations += 1
+            candidate_result = self.evaluate(candidate)
+            if candidate_result is None:
+                break
+            if candidate_result[0] > fitness_value:
+                self.search_improvements += 1
+                arrangement, result = candidate, candidate_result
+        return arrangement, result
+
+    def refine_elites(self, population, results, evaluated):
+        """Replace the best evaluated individuals, and their results, by local search improvements."""
+        # fitness scores every arrangement of an oversized load as 0
+        if not evaluated or self.upper_bound == 0:
+            return
+        elites = sorted(evaluated, key=lambda i: -results[i][0])[:max(1, len(population) // 10)]
+        budget = max(1, self.local_search_evaluations // len(elites))
+
+        # Moves resume from prefix snapshots, kept apart from any the workers hold
+        snapshots = self.snapshots
+        if snapshots is None:
+            if self.search_snapshots is None:
+                self.search_snapshots = SnapshotTrie(self.snapshot_memory)
+            self.snapshots = self.search_snapshots
+        try:
+            for i in elites:
+                arrangement, results[i] = self.improve(population.arrangement(i), results[i], budget)
+                population.put([i], Population.from_arrangements(self.items, [arrangement]))
+        finally:
+            self.snapshots = snapshots
+
+    def local_search_stats(self):
+        stats = {"evaluations": self.search_evaluations, "improvements": self.search_improvements}
+        if self.search_snapshots is not None:
+            stats["resumed_placements"] = self.search_snapshots.resumed
+        return stats
 
     def genetic_algorithm(self, population_size, generations):
         """Run the genetic algorithm with early stopping and adaptive parameters."""
         start_time = time.time()
+        self.start_budget()
+        self.fitness_cache = FitnessCache(self.cache_size)
+        # With a worker pool the snapshots live in the workers instead
+        if self.incremental and self.workers <= 1:
+            self.snapshots = SnapshotTrie(self.snapshot_memory)
 
-        population = self.initialize_population(population_size, self.items)
+        # fitness scores every arrangement of an oversized load as 0, so there is nothing to search
+        oversized = self.upper_bound == 0
+        with self.profile.phase("heuristics"):
+            constructed = [] if oversized else self.construct()
         best_solution = None
         best_utilization = 0
         best_placements = []
         best_all_placed = False
+        best_heuristic = None
+
+        # Start from the best heuristic packing
+        for name, arrangement, (fitness_value, placement, all_placed) in constructed:
+            if fitness_value > best_utilization:
+                best_all_placed = True if all_placed else False
+                best_utilization = fitness_value
+                best_solution = arrangement
+                best_placements = placement
+                best_heuristic = name
 
         # Track progress to detect stagnation
         stagnation_counter = 0
@@ -206,96 +541,527 @@ class Optimizer:
 
         # Store all results for statistical analysis
         all_results = []
+        generations_run = 0
+        stop_reason = "generations"
 
-        for gen in range(generations):
-            # Evaluate population in parallel if possible
-            evaluated_population = []
-            for individual in population:
-                fitness_value, placement, all_placed = self.fitness(
-                    self.container, individual)
-                evaluated_population.append(
-                    ((fitness_value, placement, all_placed), individual))
-
-                # Store results
-                all_results.append(fitness_value)
-
-                # Update best solution
-                if fitness_value > best_utilization:
-                    best_all_placed = True if all_placed else False
-                    best_utilization = fitness_value
-                    best_solution = individual
-                    best_placements = placement
-                    stagnation_counter = 0
-                    print(
-                        f"Generation {gen}: New best utilization: {best_utilization:.2f}%")
+        # Nothing left to improve if the load can never fit, or a heuristic placed
+        # every item or reached the upper bound
+        if oversized:
+            print("The load is larger than the container")
+            stop_reason = "bound"
+            generations = 0
+        elif constructed and best_all_placed:
+            print(f"Heuristic {best_heuristic} placed every item")
+            stop_reason = "heuristic"
+            generations = 0
+        elif constructed and self.reached_bound(best_utilization):
+            print("The heuristics reached the upper bound")
+            stop_reason = "bound"
+            generations = 0
 
-            # Sort by fitness
-            evaluated_population.sort(reverse=True, key=lambda x: x[0][0])
+        # The worker pool and the population are only needed if the GA runs
+        with self.worker_pool() if generations else nullcontext():
+            population = None if not generations else self.initialize_population(
+                population_size, self.items, [arrangement for _, arrangement, _ in constructed])
 
-            # Check if we found a perfect solution
-            if best_utilization > 99.9:
-                print(f"Perfect solution found at generation {gen}")
-                break
+            for gen in range(generations):
+                if self.budget_exhausted():
+                    print(f"Stopping at generation {gen}: {self.interrupted}")
+                    stop_reason = self.interrupted
+                    break
 
-            # Early stopping if no improvement
-            if abs(last_best - best_utilization) < 0.1:
-                stagnation_counter += 1
-            else:
-                stagnation_counter = 0
-                last_best = best_utilization
+                # Evaluate population in parallel if possible
+                improved = False
+                with self.profile.phase("evaluation"):
+                    results = self.evaluate_population(population.arrangements())
+                # Individuals the budget did not reach are left out
+                evaluated = [i for i, result in enumerate(results) if result is not None]
+                if self.local_search:
+                    with self.profile.phase("local_search"):
+                        self.refine_elites(population, results, evaluated)
+                for i in evaluated:
+                    fitness_value, placement, all_placed = results[i]
 
-            if stagnation_counter >= 10:
-                print(f"Stopping early at generation {gen} due to stagnation")
-                break
+                    # Store results
+                    all_results.append(fitness_value)
 
-            # Elitism - keep top solutions
-            elite_count = max(1, population_size // 10)
-            new_population = [individual for _,
-                              individual in evaluated_population[:elite_count]]
+                    # Update best solution
+                    if fitness_value > best_utilization:
+                        best_all_placed = True if all_placed else False
+                        best_utilization = fitness_value
+                        best_solution = population.arrangement(i)
+                        best_placements = placement
+                        stagnation_counter = 0
+                        improved = True
+                        print(
+                            f"Generation {gen}: New best utilization: {best_utilization:.2f}%")
 
-            # Create new population
-            while len(new_population) < population_size:
-                # Tournament selection
-                parent1, parent2 = self.tournament_selection(
-                    evaluated_population, tournament_size=3)
+                self.report_progress(gen, best_utilization,
+                                     self.assign_ids(best_placements) if improved else None,
+                                     start_time)
 
-                # Crossover
-                if random.random() < 0.7:  # 70% chance of crossover
-                    child = self.crossover(parent1, parent2)
-                else:
-                    child = random.choice([parent1, parent2])
+                # Stop mid-generation with the best solution so far once the budget runs out
+                if self.interrupted is not None:
+                    print(f"Stopping at generation {gen}: {self.interrupted}")
+                    stop_reason = self.interrupted
+                    break
+                generations_run += 1
 
-                # Mutation (adaptive rate)
-                # Increase mutation as stagnation increases
-                mutation_rate = 0.2 + (stagnation_counter / 20)
-                if random.random() < mutation_rate:
-                    child = self.mutate(child)
+                # No arrangement can do better than the upper bound
+                if self.reached_bound(best_utilization):
+                    print(f"Upper bound reached at generation {gen}")
+                    stop_reason = "bound"
+                    break
 
-                new_population.append(child)
+                # Check if we found a perfect solution
+                if best_utilization > 99.9:
+                    print(f"Perfect solution found at generation {gen}")
+                    stop_reason = "perfect"
+                    break
 
-            population = new_population
+                # Early stopping if no improvement
+                if abs(last_best - best_utilization) < 0.1:
+                    stagnation_counter += 1
+                else:
+                    stagnation_counter = 0
+                    last_best = best_utilization
 
-            # Optionally print progress
-            if gen % 5 == 0:
-                elapsed = time.time() - start_time
-                print(
-                    f"Generation {gen}, Best: {best_utilization:.2f}%, Time: {elapsed:.2f}s")
+                if stagnation_counter >= 10:
+                    print(f"Stopping early at generation {gen} due to stagnation")
+                    stop_reason = "stagnation"
+                    break
+
+                with self.profile.phase("breeding"):
+                    population = self.breed(population.take(evaluated),
+                                            [results[i][0] for i in evaluated],
+                                            population_size, stagnation_counter)
+
+                # Optionally print progress
+                if gen % 5 == 0:
+                    elapsed = time.time() - start_time
+                    print(
+                        f"Generation {gen}, Best: {best_utilization:.2f}%, Time: {elapsed:.2f}s")
 
         # Calculate final statistics
         print("\nOptimization completed:")
         print(f"Best utilization: {best_utilization:.2f}%")
         print(f"Time taken: {time.time() - start_time:.2f} seconds")
 
-        if best_solution and best_all_placed:
-            return {
+        stats = {
+            "generations": generations_run,
+            "evaluations": self.evaluations,
+            "elapsed_ms": round((time.time() - start_time) * 1000),
+            "stop_reason": stop_reason,
+            "cache_hits": self.fitness_cache.hits,
+            "cache_misses": self.fitness_cache.misses
+        }
+        if self.snapshots is not None:
+            stats["resumed_placements"] = self.snapshots.resumed
+        if self.local_search:
+            stats["local_search"] = self.local_search_stats()
+        if stop_reason == "heuristic":
+            stats["heuristic"] = best_heuristic
+
+        return self.make_result(best_placements, best_utilization, best_all_placed, stats)
+
+    def report_progress(self, generation, utilization, placements, start_time):
+        """Pass a generation's best utilization, and any new best placements, to the progress callback."""
+        if self.progress is None:
+            return
+        update = {
+            "generation": generation,
+            "best_utilization": round(utilization, 2),
+            "elapsed": round(time.time() - start_time, 3)
+        }
+        if placements is not None:
+            update["placements"] = placements
+        self.progress(update)
+
+    def reached_bound(self, utilization):
+        """Check whether a utilization reaches the upper bound, allowing for rounding."""
+        return utilization >= self.upper_bound - 1e-9
+
+    def assign_ids(self, placements):
+        """Replace the type index of each placement with the id of one box of that type."""
+        used = [0] * len(self.types)
+        assigned = []
+        for type_index, x, y, z, w, h, d in placements:
+            assigned.append((self.type_ids[type_index][used[type_index]], x, y, z, w, h, d))
+            used[type_index] += 1
+        return assigned
+
+    def make_result(self, placements, utilization, all_placed, stats):
+        """Build the response for the best packing found."""
+        placements = self.assign_ids(placements)
+        # How far the packing may still be from the best possible one, in percentage points
+        stats["upper_bound"] = round(self.upper_bound, 2)
+        stats["optimality_gap"] = round(max(0.0, self.upper_bound - utilization), 2)
+        if placements and all_placed:
+            result = {
                 "status": "success",
-                "placements": best_placements,
-                "space_utilization": round(best_utilization, 2)
+                "placements": placements,
+                "space_utilization": round(utilization, 2),
+                "stats": stats
             }
         else:
-            return {
+            result = {
                 "status": "failure",
-                "placements": best_placements,
-                "space_utilization": round(best_utilization, 2),
-                "message": "Not all items could be placed."
+                "placements": placements,
+                "space_utilization": round(utilization, 2),
+                "message": "Not all items could be placed.",
+                "stats": stats
             }
+        if self.report_profile:
+            # Placement phases (candidates, scan, free_spaces) are part of evaluation
+            # and heuristics; worker and island time is summed across processes
+            result["profile"] = {
+                "phases_ms": {phase: round(seconds * 1000, 2)
+                              for phase, seconds in self.profile.timings.items()},
+                "counts": dict(self.profile.counts)
+            }
+        return result
+
+    def island_model(self, population_size, generations, islands, migration_interval):
+        """Run independent sub-populations in separate processes with periodic migration.
+
+        Islands form a ring: every migration_interval generations each island sends
+        its best individuals to the next one, which replaces its worst with them.
+        """
+        # One process per island, at most one per core
+        islands = max(1, min(islands, os.cpu_count() or 1))
+        start_time = time.time()
+        self.start_budget()
+        self.fitness_cache = FitnessCache(self.cache_size)
+
+        # Skip the islands entirely if the load can never fit, or a heuristic packs
+        # every item or reaches the upper bound
+        oversized = self.upper_bound == 0
+        with self.profile.phase("heuristics"):
+            constructed = [] if oversized else self.construct()
+        finished = (None, [], 0, False) if oversized else None
+        for name, arrangement, (fitness_value, placement, all_placed) in constructed:
+            if all_placed or self.reached_bound(fitness_value):
+                finished = (name, placement, fitness_value, all_placed)
+                break
+        if finished is not None:
+            name, placement, fitness_value, all_placed = finished
+            print("The load is larger than the container" if oversized
+                  else f"Heuristic {name} placed every item" if all_placed
+                  else "The heuristics reached the upper bound")
+            stats = {
+                "generations": 0,
+                "evaluations": self.evaluations,
+                "elapsed_ms": round((time.time() - start_time) * 1000),
+                "stop_reason": "heuristic" if all_placed else "bound",
+                "cache_hits": self.fitness_cache.hits,
+                "cache_misses": self.fitness_cache.misses
+            }
+            if all_placed:
+                stats["heuristic"] = name
+            return self.make_result(placement, fitness_value, all_placed, stats)
+        seeds = [self.encode(arrangement) for _, arrangement, _ in constructed]
+
+        # Islands share the deadline and split the evaluation budget
+        island_config = dict(self.config, deadline=self.deadline)
+        if self.max_evaluations is not None:
+            island_config["max_evaluations"] = math.ceil(self.max_evaluations / islands)
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in range(islands)]
+        summaries = context.Queue()
+        stop = context.Event()
+
+        processes = [context.Process(
+            target=_run_island, daemon=True,
+            args=(self.container_data, self.items_data, island_config, index, islands,
+                  population_size, generations, migration_interval,
+                  inboxes[index], inboxes[(index + 1) % islands], summaries, stop, seeds,
+                  self.fixed))
+            for index in range(islands)]
+        for process in processes:
+            process.start()
+
+        results = []
+        best_utilization = 0
+        last_generation = -1
+        try:
+            while len(results) < islands:
+                if not stop.is_set() and self.budget_exhausted():
+                    print(f"Stopping islands: {self.interrupted}")
+                    stop.set()
+                try:
+                    summary = summaries.get(timeout=0.2)
+                except queue.Empty:
+                    if any(process.exitcode not in (None, 0) for process in processes):
+                        raise RuntimeError("An island process exited unexpectedly")
+                    continue
+                if "error" in summary:
+                    raise RuntimeError(f"Island {summary['island']} failed: {summary['error']}")
+                if "generation" not in summary:
+                    results.append(summary)
+                    continue
+
+                # Forward island progress: every new generation and every new overall best
+                improved = "placements" in summary and summary["best_utilization"] > best_utilization
+                if improved:
+                    best_utilization = summary["best_utilization"]
+                if improved or summary["generation"] > last_generation:
+                    last_generation = max(last_generation, summary["generation"])
+                    self.report_progress(summary["generation"], best_utilization,
+                                         summary["placements"] if improved else None, start_time)
+        finally:
+            stop.set()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        results.sort(key=lambda summary: summary["island"])
+        for summary in results:
+            self.profile.merge(summary["profile"])
+        best = max(results, key=lambda summary: summary["utilization"])
+
+        print("\nIsland optimization completed:")
+        print(f"Best utilization: {best['utilization']:.2f}% (island {best['island']})")
+        print(f"Time taken: {time.time() - start_time:.2f} seconds")
+
+        # Report the most significant reason any island stopped for
+        reasons = [summary["stop_reason"] for summary in results]
+        stop_reason = self.interrupted or next(
+            (reason for reason in ("bound", "perfect", "time_limit", "max_evaluations", "cancelled",
+                                   "generations") if reason in reasons), "stagnation")
+
+        stats = {
+            "generations": max(summary["generations"] for summary in results),
+            "evaluations": self.evaluations + sum(summary["evaluations"] for summary in results),
+            "elapsed_ms": round((time.time() - start_time) * 1000),
+            "stop_reason": stop_reason,
+            "cache_hits": sum(summary["cache_hits"] for summary in results),
+            "cache_misses": sum(summary["cache_misses"] for summary in results),
+            "islands": [{key: summary[key] for key in (
+                "island", "generations", "stop_reason", "crossover_rate", "mutation_rate")}
+                | {"utilization": round(summary["utilization"], 2)}
+                for summary in results]
+        }
+        if self.local_search:
+            stats["local_search"] = {key: sum(summary["local_search"][key] for summary in results)
+                                     for key in ("evaluations", "improvements")}
+        return self.make_result(best["placements"], best["utilization"], best["all_placed"], stats)
+
+    def evolve_island(self, index, islands, population_size, generations, migration_interval,
+                      inbox, outbox, stop, seeds=()):
+        """Evolve one island of the island model and summarize its best packing."""
+        # Each island explores with its own rates, from conservative to disruptive
+        share = index / max(1, islands - 1)
+        crossover_rate = 0.5 + 0.4 * share
+        mutation_rate = 0.1 + 0.3 * share
+        migration_size = max(1, int(self.config.get("migration_size", population_size // 10)))
+
+        self.start_budget()
+        self.fitness_cache = FitnessCache(self.cache_size)
+        if self.incremental:
+            self.snapshots = SnapshotTrie(self.snapshot_memory)
+
+        population = self.initialize_population(
+            population_size, self.items, [self.decode(seed) for seed in seeds])
+        best_utilization = 0
+        best_placements = []
+        best_all_placed = False
+        stagnation_counter = 0
+        last_best = 0
+        upstream_done = False
+        generations_run = 0
+        stop_reason = "generations"
+        start_time = time.time()
+
+        try:
+            for gen in range(generations):
+                if stop.is_set():
+                    stop_reason = "stopped"
+                    break
+                if self.budget_exhausted():
+                    stop_reason = self.interrupted
+                    break
+
+                with self.profile.phase("evaluation"):
+                    results = self.evaluate_population(population.arrangements())
+                evaluated = [i for i, result in enumerate(results) if result is not None]
+                if self.local_search:
+                    with self.profile.phase("local_search"):
+                        self.refine_elites(population, results, evaluated)
+                population = population.take(evaluated)
+                fitness = np.array([results[i][0] for i in evaluated])
+                improved = False
+                for fitness_value, placement, all_placed in (results[i] for i in evaluated):
+                    if fitness_value > best_utilization:
+                        best_all_placed = True if all_placed else False
+                        best_utilization = fitness_value
+                        best_placements = placement
+                        stagnation_counter = 0
+                        improved = True
+                        print(f"Island {index} generation {gen}: "
+                              f"New best utilization: {best_utilization:.2f}%")
+
+                self.report_progress(gen, best_utilization,
+                                     self.assign_ids(best_placements) if improved else None,
+                                     start_time)
+
+                if self.interrupted is not None:
+                    stop_reason = self.interrupted
+                    break
+                generations_run += 1
+
+                # Exchange the best individuals with the neighbouring islands
+                if islands > 1 and gen % migration_interval == migration_interval - 1:
+                    ranked = np.argsort(-fitness, kind="stable")
+                    best = ranked[:migration_size]
+                    outbox.put((fitness[best], population.slots[best],
+                                population.orientations[best]))
+                    migrants = None
+                    while not upstream_done and not stop.is_set() and not self.budget_exhausted():
+                        try:
+                            migrants = inbox.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        upstream_done = migrants is None
+                        break
+                    if migrants is not None:
+                        # Migrants replace the worst individuals
+                        migrant_fitness, slots, orientations = migrants
+                        survivors = ranked[:max(0, len(ranked) - len(migrant_fitness))]
+                        population = population.take(survivors).join(
+                            population.derive(slots, orientations))
+                        fitness = np.concatenate([fitness[survivors], migrant_fitness])
+
+                if self.reached_bound(best_utilization):
+                    print(f"Upper bound reached on island {index} at generation {gen}")
+                    stop_reason = "bound"
+                    stop.set()
+                    break
+
+                if best_utilization > 99.9:
+                    print(f"Perfect solution found on island {index} at generation {gen}")
+                    stop_reason = "perfect"
+                    stop.set()
+                    break
+
+                if abs(last_best - best_utilization) < 0.1:
+                    stagnation_counter += 1
+                else:
+                    stagnation_counter = 0
+                    last_best = best_utilization
+
+                if stagnation_counter >= 10:
+                    print(f"Island {index} stopping at generation {gen} due to stagnation")
+                    stop_reason = "stagnation"
+                    break
+
+                with self.profile.phase("breeding"):
+                    population = self.breed(population, fitness, population_size,
+                                            stagnation_counter, crossover_rate, mutation_rate)
+        finally:
+            # Let the next island stop waiting for migrants from this one
+            outbox.put(None)
+
+        return {
+            "island": index,
+            "utilization": best_utilization,
+            "placements": best_placements,
+            "all_placed": best_all_placed,
+            "generations": generations_run,
+            "stop_reason": stop_reason,
+            "crossover_rate": round(crossover_rate, 2),
+            "mutation_rate": round(mutation_rate, 2),
+            "evaluations": self.evaluations,
+            "cache_hits": self.fitness_cache.hits,
+            "cache_misses": self.fitness_cache.misses,
+            "local_search": self.local_search_stats(),
+            "profile": self.profile.as_dict()
+        }
+
+
+# Evaluation pools by worker count. They outlive runs, so a request does not pay
+# to fork and set up its workers; runs in different threads share them.
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+# Optimizers a pool worker built for the runs it evaluated last, by run key
+_worker_optimizers = OrderedDict()
+WORKER_RUNS = 4
+
+
+def _shared_pool(workers):
+    global _pools_pid
+    with _pools_lock:
+        # A forked child (e.g. a job worker) cannot use the pools of its parent
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if workers not in _pools:
+            _pools[workers] = multiprocessing.Pool(workers)
+        return _pools[workers]
+
+
+@atexit.register
+def _close_pools():
+    if _pools_pid == os.getpid():
+        for pool in _pools.values():
+            pool.terminate()
+    _pools.clear()
+
+
+def _worker_optimizer(key, payload):
+    """Return the optimizer for a run, building it from the run's request the first time."""
+    optimizer = _worker_optimizers.get(key)
+    if optimizer is None:
+        container_data, items_data, config, fixed = pickle.loads(payload)
+        optimizer = Optimizer(container_data, items_data, dict(config, workers=1), fixed=fixed)
+        if optimizer.incremental:
+            optimizer.snapshots = SnapshotTrie(optimizer.snapshot_memory)
+        _worker_optimizers[key] = optimizer
+        if len(_worker_optimizers) > WORKER_RUNS:
+            _worker_optimizers.popitem(last=False)
+    _worker_optimizers.move_to_end(key)
+    return optimizer
+
+
+def _evaluate_genome(task):
+    key, payload, deadline, genome = task
+    # Tasks of a run that ran out of time are skipped, not left to delay other runs
+    if deadline is not None and time.time() >= deadline:
+        return None, None
+    optimizer = _worker_optimizer(key, payload)
+    optimizer.deadline = deadline
+    result = optimizer.fitness(optimizer.container, optimizer.decode(genome))
+    # The parent merges the time this evaluation spent in each placement phase
+    return result, optimizer.profile.take()
+
+
+def _run_island(container_data, items_data, config, index, islands, population_size,
+                generations, migration_interval, inbox, outbox, summaries, stop, seeds, fixed):
+    """Process entry point for one island of Optimizer.island_model."""
+    try:
+        seed = config.get("seed")
+        deadline = config.pop("deadline")
+        island_config = dict(config, workers=1,
+                             seed=None if seed is None else f"{seed}-island-{index}")
+        if deadline is not None:
+            island_config["time_limit_ms"] = max(0, deadline - time.time()) * 1000
+        # Progress goes to the parent on the same queue as the final summary
+        optimizer = Optimizer(container_data, items_data, island_config,
+                              progress=lambda update: summaries.put(dict(update, island=index)),
+                              fixed=fixed)
+        summaries.put(optimizer.evolve_island(
+            index, islands, population_size, generations, migration_interval,
+            inbox, outbox, stop, seeds))
+    except Exception as e:
+        summaries.put({"island": index, "error": str(e)})
+
+    # Keep draining migrants so the previous island can flush its queue and exit
+    while not stop.is_set():
+        try:
+            inbox.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    # Nobody reads migrants once the run is over
+    outbox.cancel_join_thread()
@@ -0,0 +1,353 @@
+import math
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from Optimizer import *
+from Codec import *
+from Metrics import *
+from ResultCache import *
+
+
+# Processes solving the problems of a batch request
+BATCH_WORKERS = int(os.environ.get("OPTIMIZER_BATCH_WORKERS", os.cpu_count() or 1))
+# Batches already solve one problem per process, so no problem starts more
+BATCH_OVERRIDES = {"workers": 1, "islands": 1}
+
+
+class RequestError(Exception):
+    """An optimization request that fails validation."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_request(data):
+    """Validate an optimization request and return its (container, items, config)."""
+    # Validate request
+    if not data:
+        raise RequestError("No data provided")
+
+    if "container" not in data or "items" not in data:
+        raise RequestError("Missing container or items data")
+
+    container = parse_container(data["container"])
+
+    items = data["items"]
+    if not items or not isinstance(items, list):
+        raise RequestError("No items provided or invalid items format")
+    parse_items(items)
+
+    return container, items, parse_config(data.get("config", None))
+
+
+def parse_container(container):
+    """Validate container dimensions in place, returning the container."""
+    if "width" not in container or "height" not in container or "depth" not in container:
+        raise RequestError("Container dimensions not specified")
+
+    # Boxes already in the container are given to /repack as placements
+    if "fixed" in container:
+        raise RequestError("Unknown container field: fixed")
+
+    # Ensure that the container dimensions are integers
+    container['width'] = int(container['width'])
+    container['height'] = int(container['height'])
+    container['depth'] = int(container['depth'])
+    return container
+
+
+def parse_items(items):
+    """Validate item dimensions in place, casting them to integers in a single pass."""
+    try:
+        for item in items:
+            dim = item["dimensions"]
+            dim["width"], dim["height"], dim["depth"] = int(dim["width"]), int(dim["height"]), int(dim["depth"])
+        return
+    except (KeyError, TypeError):
+        pass
+
+    # Go over the items again to report what is wrong
+    for item in items:
+        if "dimensions" not in item:
+            raise RequestError("Item missing dimensions")
+        dim = item["dimensions"]
+        if "width" not in dim or "height" not in dim or "depth" not in dim:
+            raise RequestError("Item dimensions incomplete")
+
+        # Ensure item dimensions are integers
+        dim['width'] = int(dim['width'])
+        dim['height'] = int(dim['height'])
+        dim['depth'] = int(dim['depth'])
+
+
+def parse_config(config):
+    """Fill in the defaults of an optional request config and validate it."""
+    # Set default values if config is None or contains invalid/empty values
+    if not config or not isinstance(config, dict):
+        config = {
+            "population_size": 30,
+            "generations": 50,
+            "placement": "candidates",
+            "occupancy": "dense",
+            "cache_size": 1024,
+            "islands": 1,
+            "migration_interval": 5
+        }
+    else:
+        config["population_size"] = int(
+            config.get("population_size", 30) or 30)
+        config["generations"] = int(config.get("generations", 50) or 50)
+        config["placement"] = config.get("placement", "candidates") or "candidates"
+        config["occupancy"] = config.get("occupancy", "dense") or "dense"
+        # 0 turns the fitness cache off, so only a missing or null size gets the default
+        cache_size = config.get("cache_size")
+        config["cache_size"] = 1024 if cache_size is None else int(cache_size)
+        # Every island is a process of its own, so there are at most as many as cores
+        config["islands"] = max(1, min(int(config.get("islands", 1) or 1), os.cpu_count() or 1))
+        config["migration_interval"] = int(config.get("migration_interval", 5) or 5)
+
+    if config["placement"] not in PLACEMENT_STRATEGIES:
+        raise RequestError("Unknown placement strategy")
+
+    if config["occupancy"] not in OCCUPANCY_BACKENDS:
+        raise RequestError("Unknown occupancy backend")
+
+    if config.get("response_format", "json") not in RESPONSE_FORMATS:
+        raise RequestError("Unknown response format")
+
+    return config
+
+
+def run_optimization(container, items, config, progress=None, should_stop=None, fixed=()):
+    """Run the optimizer mode selected by config on a validated request, around any fixed boxes."""
+    optimizer = Optimizer(container, items, config, progress, should_stop, fixed)
+
+    # Perform optimization
+    if config["islands"] > 1:
+        result = optimizer.island_model(
+            config["population_size"], config["generations"],
+            config["islands"], config["migration_interval"])
+    else:
+        result = optimizer.genetic_algorithm(
+            config["population_size"], config["generations"])
+
+    record_run(result, optimizer.profile)
+    return result
+
+
+def run_cached_optimization(container, items, config, cache, slot=nullcontext):
+    """Run an optimization through the shared result cache, keyed on the canonical request.
+
+    The context manager slot() (e.g. a size class slot) is held only while the
+    optimizer runs, so cache hits never wait for it.
+    """
+    # Time-limited runs depend on machine speed, so their results are not reproducible
+    if config.get("time_limit_ms") is not None:
+        with slot():
+            result = run_optimization(container, items, config)
+        result["stats"]["result_cache"] = "bypass"
+        return result
+
+    key, canonical_items, ids = canonical_request(container, items, config)
+    result = cache.get(key)
+    if result is None:
+        with slot():
+            result = run_optimization(container, canonical_items, config)
+        if result["stats"]["stop_reason"] != "cancelled":
+            cache.put(key, result)
+        result["stats"]["result_cache"] = "miss"
+    else:
+        result["stats"]["result_cache"] = "hit"
+
+    # Map canonical item numbers back to the ids of this request
+    result["placements"] = [[ids[placement[0]], *placement[1:]]
+                            for placement in result["placements"]]
+    return result
+
+
+def parse_repack_request(data):
+    """Validate a repack request and return its (container, placements, added, removed, config).
+
+    placements are those of a previous result, as [id, x, y, z, w, h, d] lists;
+    add lists new items like a request's items and remove the ids of placed
+    items taken out.
+    """
+    if not data:
+        raise RequestError("No data provided")
+
+    if "container" not in data or "placements" not in data:
+        raise RequestError("Missing container or placements data")
+
+    container = parse_container(data["container"])
+
+    placements = data["placements"]
+    if not isinstance(placements, list):
+        raise RequestError("Invalid placements format")
+    occupied = SparseContainer(container["width"], container["height"], container["depth"])
+    for i, placement in enumerate(placements):
+        if not isinstance(placement, list) or len(placement) != 7:
+            raise RequestError("Placements must be [id, x, y, z, width, height, depth] lists")
+        box_id, x, y, z, w, h, d = placement[0], *(int(value) for value in placement[1:])
+        if min(x, y, z) < 0 or min(w, h, d) < 1 or not occupied.fits(x, y, z, w, h, d):
+            raise RequestError(f"Placement {i} is outside the container or overlaps another")
+        occupied.place_item(Item(box_id, w, h, d), x, y, z, w, h, d)
+        placements[i] = [box_id, x, y, z, w, h, d]
+
+    added = data.get("add") or []
+    if not isinstance(added, list):
+        raise RequestError("Invalid add format")
+    parse_items(added)
+
+    removed = data.get("remove") or []
+    if not isinstance(removed, list):
+        raise RequestError("Invalid remove format")
+    placed_ids = {placement[0] for placement in placements}
+    for box_id in removed:
+        if box_id not in placed_ids:
+            raise RequestError(f"Cannot remove {box_id!r}: no such placement")
+
+    config = parse_config(data.get("config", None))
+    # Placed items nearest the edit that may be moved when the added items do not fit
+    config["neighbourhood"] = int(config.get("neighbourhood", 10) or 0)
+    return container, placements, added, removed, config
+
+
+def nearest_placements(placements, targets, count):
+    """Return the indices of the count placements whose centres are closest to any target's."""
+    def centre(placement):
+        _, x, y, z, w, h, d = placement
+        return x + w / 2, y + h / 2, z + d / 2
+
+    centres = [centre(target) for target in targets]
+    def distance(i):
+        return min(math.dist(centre(placements[i]), c) for c in centres)
+
+    return set(sorted(range(len(placements)), key=distance)[:count]) if centres else set()
+
+
+def run_repack(container, placements, added, removed, config):
+    """Repack a previous result after items were added or removed.
+
+    Every placement the edit does not touch stays where it is. The added items
+    are first placed around them by the constructive heuristics alone; only if
+    that fails does the GA run, over the added items plus the neighbourhood of
+    placements nearest the edit. The work grows with the edit, not the load.
+    """
+    removed = set(removed)
+    kept = [placement for placement in placements if placement[0] not in removed]
+    # Where the load changed: the removed boxes, or else the last one packed
+    edited = [placement for placement in placements if placement[0] in removed] or kept[-1:]
+    container_volume = container["width"] * container["height"] * container["depth"]
+    summary = {"added": len(added), "removed": len(placements) - len(kept)}
+
+    if not added:
+        return {
+            "status": "success",
+            "placements": kept,
+            "space_utilization": round(sum(p[4] * p[5] * p[6] for p in kept) / container_volume * 100, 2),
+            "stats": {"generations": 0, "evaluations": 0, "repack": dict(summary, kept=len(kept), released=0)}
+        }
+
+    attempts = [
+        # Place only the added items, keeping everything else fixed
+        (set(), dict(config, heuristics=True, generations=0, islands=1)),
+        # Let the GA move the neighbourhood of the edit as well
+        (nearest_placements(kept, edited, config["neighbourhood"]), config),
+    ]
+    best, best_rank = None, None
+    for released, attempt_config in attempts:
+        fixed = [placement for i, placement in enumerate(kept) if i not in released]
+        items = added + [{"id": kept[i][0], "dimensions": dict(zip(("width", "height", "depth"), kept[i][4:]))}
+                         for i in sorted(released)]
+        result = run_optimization(container, items, dict(attempt_config), fixed=fixed)
+        placed_ids = {placement[0] for placement in result["placements"]}
+        result["placements"] = fixed + result["placements"]
+        result["stats"]["repack"] = dict(summary, kept=len(fixed), released=len(released))
+
+        # A packing that drops boxes placed before is only better if it places everything
+        rank = (result["status"] == "success", all(kept[i][0] in placed_ids for i in released),
+                result["space_utilization"])
+        if best is None or rank > best_rank:
+            best, best_rank = result, rank
+        if result["status"] == "success":
+            break
+    return best
+
+
+def solve(data, cache=None, admission=None, overrides=None):
+    """Validate and run one raw request, returning its result or an error response.
+
+    overrides replace config options after validation. admission, if given, is
+    called like Admission.admit to downgrade or refuse the request first.
+    """
+    try:
+        container, items, config = parse_request(data)
+        config.update(overrides or {})
+        if admission is not None:
+            estimate, downgrades = admission(container, items, config)
+        if cache is not None:
+            result = run_cached_optimization(container, items, config, cache)
+        else:
+            result = run_optimization(container, items, config)
+        if admission is not None:
+            result["stats"]["admission"] = dict(estimate, downgrades=downgrades)
+        return result
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+_batch_cache = None
+_batch_admission = None
+
+
+def _init_batch_worker(cache_path, admission):
+    """Keep optimizer logging out of the results, which may be written to stdout."""
+    global _batch_cache, _batch_admission
+    sys.stdout = sys.stderr
+    if cache_path is not None:
+        _batch_cache = ResultCache(cache_path)
+    _batch_admission = admission
+
+
+def _solve_batch_problem(index, data):
+    # Problems may arrive as raw JSON lines
+    if isinstance(data, (str, bytes)):
+        try:
+            data = loads(data)
+        except ValueError:
+            return {"status": "error", "message": "Invalid JSON", "index": index}
+    result = solve(data, _batch_cache, _batch_admission, BATCH_OVERRIDES)
+    if isinstance(data, dict) and data.get("id") is not None:
+        result["id"] = data["id"]
+    result["index"] = index
+    return result
+
+
+def solve_batch(problems, workers, cache_path=None, admission=None):
+    """Solve raw requests on a process pool, yielding each result as soon as it finishes.
+
+    problems may be any iterable (e.g. the lines of a file). Only 2 * workers
+    problems are read ahead, so memory stays bounded however many there are.
+    Results come in completion order and carry the index of their problem.
+    Each problem runs in a single process and, given admission (e.g.
+    Admission.admit), is downgraded or refused like a single request.
+    """
+    executor = ProcessPoolExecutor(workers, initializer=_init_batch_worker,
+                                   initargs=(cache_path, admission))
+    try:
+        pending = set()
+        for index, data in enumerate(problems):
+            pending.add(executor.submit(_solve_batch_problem, index, data))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # A client that stops reading cancels the problems not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
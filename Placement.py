@@ -0,0 +1,183 @@
+import time
+import numpy as np
+
+
+def grid_positions(x_end, y_end, z_end, step=1, chunk_size=4096):
+    """Yield the (x, y, z) grid positions below the given ends in scan order, as row chunks."""
+    xs, ys, zs = [np.arange(0, max(0, end), step) for end in (x_end, y_end, z_end)]
+    total = len(xs) * len(ys) * len(zs)
+    # Chunks are built on demand so a scan that finds a fit early stays cheap
+    for start in range(0, total, chunk_size):
+        index = np.arange(start, min(total, start + chunk_size))
+        yz, z = np.divmod(index, len(zs))
+        x, y = np.divmod(yz, len(ys))
+        yield np.stack([xs[x], ys[y], zs[z]], axis=1)
+
+
+class CandidatePlacement:
+    """Place items on the surfaces of placed items, falling back to scanning the container."""
+
+    def __init__(self, container, profile=None, should_abort=None):
+        self.container = container
+        # Optional Profile timing the candidate and scan phases and counting fit checks
+        self.profile = profile
+        # Optional callback; a true should_abort() gives up a scan between chunks
+        self.should_abort = should_abort
+
+    def find_position(self, w, h, d):
+        """Return the first (x, y, z) where an item of size (w, h, d) fits, or None.
+
+        A scan given up because should_abort() was true also returns None.
+        """
+        container = self.container
+        start = time.perf_counter()
+
+        # Try to place the item at lowest coordinates first (bottom-left-front strategy)
+        candidates = []
+
+        # First try corners and edges where items are already placed
+        # Start with (0,0,0) as the first candidate
+        candidates.append((0, 0, 0))
+
+        # Add positions that are adjacent to already placed items
+        for _, px, py, pz, pw, ph, pd in container.placements:
+            # Add positions adjacent to placed items (6 surfaces)
+            candidates.extend([
+                (px + pw, py, pz),  # Right surface
+                (px, py + ph, pz),  # Back surface
+                (px, py, pz + pd),  # Top surface
+            ])
+
+        # Remove duplicates and out-of-bounds positions
+        candidates = np.array(candidates, dtype=np.int64)
+        candidates = candidates[(candidates[:, 0] < container.w - w + 1) &
+                                (candidates[:, 1] < container.h - h + 1) &
+                                (candidates[:, 2] < container.d - d + 1)]
+
+        # Try candidate positions first (much fewer than all positions)
+        index = container.first_fit(candidates, w, h, d)
+        self.count_checks(candidates, index)
+        scan_start = time.perf_counter()
+        if self.profile is not None:
+            self.profile.add("candidates", scan_start - start)
+        if index is not None:
+            return tuple(candidates[index].tolist())
+
+        # If no candidate positions work, try a subset of all positions
+        # Sample a subset of positions for efficiency, then try all positions
+        step = max(1, min(container.w, container.h, container.d) // 4)
+        try:
+            for scan_step in ([step, 1] if step > 1 else [1]):
+                for positions in grid_positions(container.w - w + 1, container.h - h + 1,
+                                                container.d - d + 1, scan_step):
+                    index = container.first_fit(positions, w, h, d)
+                    self.count_checks(positions, index)
+                    if index is not None:
+                        return tuple(positions[index].tolist())
+                    if self.should_abort is not None and self.should_abort():
+                        return None
+        finally:
+            if self.profile is not None:
+                self.profile.add("scan", time.perf_counter() - scan_start)
+
+        return None
+
+    def count_checks(self, positions, index):
+        """Count the positions first_fit checked, up to and including the first fit."""
+        if self.profile is not None:
+            self.profile.count("fits_checks", len(positions) if index is None else index + 1)
+
+    def place_item(self, item, x, y, z, w, h, d):
+        self.container.place_item(item, x, y, z, w, h, d)
+
+    def copy(self):
+        return CandidatePlacement(self.container.copy(), self.profile, self.should_abort)
+
+    def nbytes(self):
+        return self.container.nbytes()
+
+
+class ExtremePointPlacement:
+    """Place items on the corners of a maintained set of maximal free spaces.
+
+    Every free region of the container is covered by some maximal empty box, so
+    an item fits somewhere exactly when it fits inside one of them and no
+    occupancy scan is needed. Each placement splits the spaces it overlaps into
+    at most six pieces and drops any piece that is nested in another one or is
+    too thin to ever hold an item.
+    """
+
+    def __init__(self, container, min_size=1, profile=None):
+        self.container = container
+        self.min_size = min_size
+        self.spaces = [(0, 0, 0, container.w, container.h, container.d)]
+        # Optional Profile timing the search and upkeep of the free spaces
+        self.profile = profile
+
+    def find_position(self, w, h, d):
+        """Return the lowest corner of a free space that can hold (w, h, d), or None."""
+        start = time.perf_counter()
+        best = None
+        for x0, y0, z0, x1, y1, z1 in self.spaces:
+            if x1 - x0 >= w and y1 - y0 >= h and z1 - z0 >= d:
+                if best is None or (x0, y0, z0) < best:
+                    best = (x0, y0, z0)
+        if self.profile is not None:
+            self.profile.add("free_spaces", time.perf_counter() - start)
+        return best
+
+    def place_item(self, item, x, y, z, w, h, d):
+        """Place an item and split the free spaces it overlaps."""
+        start = time.perf_counter()
+        self.container.place_item(item, x, y, z, w, h, d)
+        x1, y1, z1 = x + w, y + h, z + d
+
+        kept, pieces = [], set()
+        for space in self.spaces:
+            sx0, sy0, sz0, sx1, sy1, sz1 = space
+            if sx0 >= x1 or sx1 <= x or sy0 >= y1 or sy1 <= y or sz0 >= z1 or sz1 <= z:
+                kept.append(space)
+                continue
+            # Keep the parts of the space on each side of the new box
+            if x > sx0:
+                pieces.add((sx0, sy0, sz0, x, sy1, sz1))
+            if x1 < sx1:
+                pieces.add((x1, sy0, sz0, sx1, sy1, sz1))
+            if y > sy0:
+                pieces.add((sx0, sy0, sz0, sx1, y, sz1))
+            if y1 < sy1:
+                pieces.add((sx0, y1, sz0, sx1, sy1, sz1))
+            if z > sz0:
+                pieces.add((sx0, sy0, sz0, sx1, sy1, z))
+            if z1 < sz1:
+                pieces.add((sx0, sy0, z1, sx1, sy1, sz1))
+
+        min_size = self.min_size
+        pieces = sorted((p for p in pieces if
+                         p[3] - p[0] >= min_size and
+                         p[4] - p[1] >= min_size and
+                         p[5] - p[2] >= min_size),
+                        key=lambda p: (p[3] - p[0]) * (p[4] - p[1]) * (p[5] - p[2]),
+                        reverse=True)
+
+        # A piece nested in a larger one is not maximal; nesting is transitive,
+        # so checking against the pieces kept so far is enough
+        maximal = []
+        for p in pieces:
+            if not any(o[0] <= p[0] and o[1] <= p[1] and o[2] <= p[2] and
+                       o[3] >= p[3] and o[4] >= p[4] and o[5] >= p[5]
+                       for o in maximal):
+                maximal.append(p)
+        self.spaces = kept + maximal
+        if self.profile is not None:
+            self.profile.add("free_spaces", time.perf_counter() - start)
+
+    def copy(self):
+        clone = ExtremePointPlacement(self.container.copy(), self.min_size, self.profile)
+        clone.spaces = list(self.spaces)
+        return clone
+
+    def nbytes(self):
+        return self.container.nbytes() + 100 * len(self.spaces)
+
+PLACEMENT_STRATEGIES = ("candidates", "extreme_points")
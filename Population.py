@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class Population:
+    """GA individuals stored as rows of two (individuals, boxes) integer arrays.
+
+    Row i of slots lists the boxes of individual i in packing order, as indexes
+    into items, and the same row of orientations holds the index of each box's
+    orientation. Rows are kept canonical: the k-th box of a type in a row is
+    always the k-th box of that type in items, so individuals that only swap
+    identical boxes are the same row. All operators work on whole arrays.
+    """
+
+    def __init__(self, items, slots, orientations):
+        self.items = items
+        self.slots = slots
+        self.orientations = orientations
+        self.slot_types = np.array([item.id for item in items], dtype=np.int64)
+        self.orientation_counts = np.array([len(item.orientations) for item in items],
+                                           dtype=np.int64)
+        # Slots grouped by type, in order; canonical rows assign them in this order
+        self.type_order = np.argsort(self.slot_types, kind="stable")
+
+    @classmethod
+    def from_arrangements(cls, items, arrangements):
+        """Build a population from lists of (item, orientation) genes."""
+        types = np.array([[item.id for item, _ in arrangement]
+                          for arrangement in arrangements], dtype=np.int64)
+        orientations = np.array([[item.orientations.index(orientation)
+                                  for item, orientation in arrangement]
+                                 for arrangement in arrangements], dtype=np.int64)
+        types = types.reshape(len(arrangements), len(items))
+        orientations = orientations.reshape(types.shape)
+        population = cls(items, None, orientations)
+        population.slots = population.canonical(types)
+        return population
+
+    def __len__(self):
+        return len(self.slots)
+
+    def derive(self, slots, orientations):
+        """Return a population over the same items holding the given rows."""
+        population = Population.__new__(Population)
+        population.items = self.items
+        population.slot_types = self.slot_types
+        population.orientation_counts = self.orientation_counts
+        population.type_order = self.type_order
+        population.slots = slots
+        population.orientations = orientations
+        return population
+
+    def canonical(self, types):
+        """Assign slots to rows of item types, the k-th box of a type getting its k-th slot."""
+        positions = np.argsort(types, axis=1, kind="stable")
+        slots = np.empty_like(types)
+        np.put_along_axis(slots, positions,
+                          np.broadcast_to(self.type_order, types.shape), axis=1)
+        return slots
+
+    def take(self, indices):
+        return self.derive(self.slots[indices], self.orientations[indices])
+
+    def put(self, indices, other):
+        """Overwrite the rows at indices with the rows of other, in place."""
+        self.slots[indices] = other.slots
+        self.orientations[indices] = other.orientations
+
+    def join(self, other):
+        return self.derive(np.concatenate([self.slots, other.slots]),
+                           np.concatenate([self.orientations, other.orientations]))
+
+    def arrangement(self, index):
+        """Decode one individual into a list of (item, orientation) genes."""
+        return [(self.items[slot], self.items[slot].orientations[k])
+                for slot, k in zip(self.slots[index].tolist(), self.orientations[index].tolist())]
+
+    def arrangements(self):
+        return [self.arrangement(index) for index in range(len(self))]
+
+    def tournament(self, fitness, count, size, rng):
+        """Pick count winners of tournaments between size distinct individuals."""
+        size = min(size, len(fitness))
+        contenders = rng.random((count, len(fitness))).argsort(axis=1)[:, :size]
+        return contenders[np.arange(count), fitness[contenders].argmax(axis=1)]
+
+    def crossover(self, parents1, parents2, rng):
+        """Order crossover: keep a random segment of parent1 and fill the rest in parent2's order."""
+        count, n = len(parents1), self.slots.shape[1]
+        slots1, slots2 = self.slots[parents1], self.slots[parents2]
+        orientations1, orientations2 = self.orientations[parents1], self.orientations[parents2]
+
+        start = rng.integers(0, n, count)
+        end = rng.integers(start + 1, n + 1)
+        positions = np.arange(n)
+        segment = (positions >= start[:, None]) & (positions < end[:, None])
+
+        # Every row keeps exactly as many of parent2's genes as it has free positions,
+        # so boolean indexing fills the free positions row by row in parent2's order
+        rows = np.arange(count)[:, None]
+        taken = np.zeros((count, n), dtype=bool)
+        taken[np.broadcast_to(rows, (count, n))[segment], slots1[segment]] = True
+        keep = ~taken[rows, slots2]
+
+        slots = slots1.copy()
+        slots[~segment] = slots2[keep]
+        orientations = orientations1.copy()
+        orientations[~segment] = orientations2[keep]
+        return self.derive(self.canonical(self.slot_types[slots]), orientations)
+
+    def mutate(self, selected, rng):
+        """Apply swap, orientation and segment reversal mutations to the selected rows in place."""
+        rows = np.flatnonzero(selected)
+        count, n = len(rows), self.slots.shape[1]
+
+        # Swap mutation, only between boxes of different types
+        swap = rows[rng.random(count) < 0.3]
+        types = self.slot_types[self.slots[swap]]
+        i = rng.integers(0, n, len(swap))
+        others = types != types[np.arange(len(swap)), i][:, None]
+        choices = others.sum(axis=1)
+        pick = (rng.random(len(swap)) * choices).astype(np.int64)
+        j = (np.cumsum(others, axis=1) > pick[:, None]).argmax(axis=1)
+        swap, i, j = swap[choices > 0], i[choices > 0], j[choices > 0]
+        for genes in (self.slots, self.orientations):
+            genes[swap, i], genes[swap, j] = genes[swap, j], genes[swap, i]
+
+        # Orientation mutation
+        turn = rows[rng.random(count) < 0.3]
+        i = rng.integers(0, n, len(turn))
+        counts = self.orientation_counts[self.slots[turn, i]]
+        self.orientations[turn, i] = (rng.random(len(turn)) * counts).astype(np.int64)
+
+        # Rotation mutation - reverse a random segment of 2 to 5 genes
+        if n > 3:
+            flip = rows[rng.random(count) < 0.2]
+            start = rng.integers(0, n - 2, len(flip))
+            end = rng.integers(start + 2, np.minimum(n, start + 5) + 1)
+            positions = np.arange(n)
+            inside = (positions >= start[:, None]) & (positions < end[:, None])
+            index = np.where(inside, (start + end - 1)[:, None] - positions, positions)
+            for genes in (self.slots, self.orientations):
+                genes[flip] = np.take_along_axis(genes[flip], index, axis=1)
+
+        self.slots[rows] = self.canonical(self.slot_types[self.slots[rows]])
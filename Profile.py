@@ -0,0 +1,42 @@
+import time
+from contextlib import contextmanager
+
+
+class Profile:
+    """Seconds spent per optimizer phase and counts of hot-path operations."""
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+
+    def add(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def merge(self, other):
+        """Add a profile from as_dict(), e.g. one collected in another process."""
+        for phase, seconds in other["timings"].items():
+            self.add(phase, seconds)
+        for name, n in other["counts"].items():
+            self.count(name, n)
+
+    def as_dict(self):
+        return {"timings": dict(self.timings), "counts": dict(self.counts)}
+
+    def take(self):
+        """Return as_dict() and start over; placements keep referring to this profile."""
+        taken = self.as_dict()
+        self.timings.clear()
+        self.counts.clear()
+        return taken
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+
+# Results are kept in a SQLite file so every server worker process shares them
+RESULTS_DB = os.environ.get(
+    "OPTIMIZER_RESULTS_DB", os.path.join(tempfile.gettempdir(), "optimizer-results.sqlite3"))
+RESULTS_TTL = int(os.environ.get("OPTIMIZER_RESULTS_TTL", 24 * 3600))
+RESULTS_MAX_MB = float(os.environ.get("OPTIMIZER_RESULTS_MAX_MB", 256))
+
+# Config options that change how fast a result is found, or how it is returned,
+# but not the result itself
+EXECUTION_OPTIONS = ("workers", "cache_size", "incremental", "snapshot_interval",
+                     "snapshot_memory_mb", "occupancy", "response_format")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+"""
+
+
+def canonical_request(container, items, config):
+    """Return (fingerprint, canonical items, ids) for a validated request.
+
+    Canonical items are sorted by their sorted dimensions and numbered in that
+    order, so requests that only differ in item ids, item order or how each
+    item is turned share a fingerprint. ids[i] is the request id of canonical
+    item i.
+    """
+    dims = [tuple(sorted((item["dimensions"]["width"], item["dimensions"]["height"],
+                          item["dimensions"]["depth"]))) for item in items]
+    order = sorted(range(len(items)), key=lambda i: dims[i])
+    canonical_items = [{"id": index, "dimensions": dict(zip(("width", "height", "depth"), dims[i]))}
+                       for index, i in enumerate(order)]
+    ids = [items[i].get("id") for i in order]
+
+    # max_evaluations only counts fitness cache misses, so with it the cache size
+    # changes where the run stops
+    options = EXECUTION_OPTIONS
+    if config.get("max_evaluations") is not None:
+        options = tuple(option for option in EXECUTION_OPTIONS if option != "cache_size")
+
+    canonical = {
+        "container": [container["width"], container["height"], container["depth"]],
+        "items": [dims[i] for i in order],
+        "config": {key: value for key, value in config.items() if key not in options}
+    }
+    fingerprint = hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+    return fingerprint, canonical_items, ids
+
+
+class ResultCache:
+    """Optimization results by request fingerprint, expired by age and evicted by size."""
+
+    def __init__(self, path=RESULTS_DB, ttl=RESULTS_TTL, max_bytes=RESULTS_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        with closing(self.connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        """Return the cached result for key, or None if it is missing or expired."""
+        now = time.time()
+        with closing(self.connect()) as db, db:
+            row = db.execute("SELECT result FROM results WHERE key = ? AND created >= ?",
+                             (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store a result, then drop expired entries and the least recently used over the size cap."""
+        data = json.dumps(result)
+        now = time.time()
+        with closing(self.connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO results (key, result, size, created, used) "
+                       "VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now, now))
+            db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+            db.execute("DELETE FROM results WHERE key IN (SELECT key FROM ("
+                       "SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS total "
+                       "FROM results) WHERE total > ?)", (self.max_bytes,))
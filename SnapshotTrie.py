@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+
+class _Node:
+    __slots__ = ("parent", "gene", "children", "snapshot")
+
+    def __init__(self, parent=None, gene=None):
+        self.parent = parent
+        self.gene = gene
+        self.children = {}
+        self.snapshot = None
+
+
+class SnapshotTrie:
+    """Trie of evaluated placement prefixes holding snapshots of the packing state.
+
+    Each node is one (item id, orientation) gene; a node may hold a snapshot of
+    the state reached after placing its prefix. Snapshots are never modified,
+    so callers must copy one before placing more items on it. Total snapshot
+    memory is capped, evicting the least recently used snapshots first.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.root = _Node()
+        self.sizes = OrderedDict()  # Nodes holding a snapshot -> its size in bytes
+        self.total_bytes = 0
+        self.resumed = 0  # Placements skipped by resuming from snapshots
+
+    def longest_prefix(self, genes):
+        """Return (depth, snapshot) for the longest snapshotted prefix of genes."""
+        node = self.root
+        depth, found = 0, None
+        for i, gene in enumerate(genes):
+            node = node.children.get(gene)
+            if node is None:
+                break
+            if node.snapshot is not None:
+                depth, found = i + 1, node
+        if found is None:
+            return 0, None
+        self.sizes.move_to_end(found)
+        self.resumed += depth
+        return depth, found.snapshot
+
+    def insert(self, genes, snapshot, size):
+        """Store the snapshot reached after placing all of genes."""
+        if size > self.max_bytes:
+            return
+        node = self.root
+        for gene in genes:
+            child = node.children.get(gene)
+            if child is None:
+                child = node.children[gene] = _Node(node, gene)
+            node = child
+        if node.snapshot is not None:
+            self.total_bytes -= self.sizes.pop(node)
+        node.snapshot = snapshot
+        self.sizes[node] = size
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            evicted, evicted_size = self.sizes.popitem(last=False)
+            self.total_bytes -= evicted_size
+            evicted.snapshot = None
+            self._prune(evicted)
+
+    def _prune(self, node):
+        """Drop nodes that no longer lead to any snapshot."""
+        while node.parent is not None and node.snapshot is None and not node.children:
+            del node.parent.children[node.gene]
+            node = node.parent
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class SparseContainer:
+    """Container that stores placed boxes instead of a voxel grid.
+
+    Memory and query time depend on the number of placements rather than on
+    w * h * d, so containers can be described in fine units (e.g. millimetres).
+    """
+
+    def __init__(self, w, h, d):
+        self.w, self.h, self.d = w, h, d
+        self.placements = []  # Store placed item positions
+        # Box corners as rows of (x0, y0, z0, x1, y1, z1), grown on demand
+        self.boxes = np.zeros((16, 6), dtype=np.int64)
+        self.count = 0
+        self.used_volume = 0
+
+    def fits(self, x, y, z, w, h, d):
+        """Check if an item fits at (x, y, z) by testing it against every placed box"""
+        # Check boundaries
+        if x + w > self.w or y + h > self.h or z + d > self.d:
+            return False
+
+        boxes = self.boxes[:self.count]
+        # Two boxes overlap only if their extents overlap on all three axes
+        overlap = ((boxes[:, 0] < x + w) & (boxes[:, 3] > x) &
+                   (boxes[:, 1] < y + h) & (boxes[:, 4] > y) &
+                   (boxes[:, 2] < z + d) & (boxes[:, 5] > z))
+        return not overlap.any()
+
+    def first_fit(self, positions, w, h, d):
+        """Return the index of the first (x, y, z) row of positions where the item fits, or None"""
+        for i, (x, y, z) in enumerate(positions.tolist()):
+            if self.fits(x, y, z, w, h, d):
+                return i
+        return None
+
+    def place_item(self, item, x, y, z, w, h, d):
+        """Place an item by recording its box"""
+        if self.count == len(self.boxes):
+            self.boxes = np.concatenate([self.boxes, np.zeros_like(self.boxes)])
+        self.boxes[self.count] = (x, y, z, x + w, y + h, z + d)
+        self.count += 1
+        self.used_volume += w * h * d
+        self.placements.append((item.id, x, y, z, w, h, d))
+
+    def copy(self):
+        """Return an independent copy of this container"""
+        clone = SparseContainer.__new__(SparseContainer)
+        clone.w, clone.h, clone.d = self.w, self.h, self.d
+        clone.placements = list(self.placements)
+        clone.boxes = self.boxes.copy()
+        clone.count = self.count
+        clone.used_volume = self.used_volume
+        return clone
+
+    def nbytes(self):
+        """Approximate memory held by this container, in bytes"""
+        return self.boxes.nbytes + 64 * len(self.placements)
+
+    def get_utilization(self):
+        total_volume = self.w * self.h * self.d
+        return (self.used_volume / total_volume) * 100
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class SummedVolumeContainer:
+    """Container that keeps a 3D summed-volume table of its occupied cells.
+
+    table[i, j, k] holds the number of occupied cells in [0, i) x [0, j) x [0, k),
+    so the occupancy of any box is found with 8 lookups, and a whole array of
+    candidate positions can be checked in one vectorized call.
+    """
+
+    def __init__(self, w, h, d):
+        self.w, self.h, self.d = w, h, d
+        self.placements = []  # Store placed item positions
+        self.table = np.zeros((w + 1, h + 1, d + 1), dtype=np.int32)
+
+    def occupied(self, x, y, z, w, h, d):
+        """Count the occupied cells in the box at (x, y, z) with size (w, h, d)"""
+        t = self.table
+        x1, y1, z1 = x + w, y + h, z + d
+        return (t[x1, y1, z1] - t[x, y1, z1] - t[x1, y, z1] - t[x1, y1, z]
+                + t[x, y, z1] + t[x, y1, z] + t[x1, y, z] - t[x, y, z])
+
+    def fits(self, x, y, z, w, h, d):
+        """Check if an item fits at (x, y, z) with 8 table lookups"""
+        # Check boundaries
+        if x + w > self.w or y + h > self.h or z + d > self.d:
+            return False
+        return self.occupied(x, y, z, w, h, d) == 0
+
+    def first_fit(self, positions, w, h, d):
+        """Return the index of the first (x, y, z) row of positions where the item fits, or None"""
+        if w > self.w or h > self.h or d > self.d:
+            return None
+        x, y, z = positions.T
+        inside = (x + w <= self.w) & (y + h <= self.h) & (z + d <= self.d)
+        # Clip out-of-bounds positions so their lookups stay inside the table
+        x, y, z = np.minimum(x, self.w - w), np.minimum(y, self.h - h), np.minimum(z, self.d - d)
+        free = np.flatnonzero(inside & (self.occupied(x, y, z, w, h, d) == 0))
+        return int(free[0]) if len(free) else None
+
+    def place_item(self, item, x, y, z, w, h, d):
+        """Place an item by adding its overlap with every prefix box to the table"""
+        # A prefix [0, i) x [0, j) x [0, k) overlaps the item in a box whose sides
+        # only depend on i, j and k separately, so the update is an outer product
+        dx = np.clip(np.arange(x + 1, self.w + 1) - x, 0, w)
+        dy = np.clip(np.arange(y + 1, self.h + 1) - y, 0, h)
+        dz = np.clip(np.arange(z + 1, self.d + 1) - z, 0, d)
+        self.table[x + 1:, y + 1:, z + 1:] += (
+            dx[:, None, None] * dy[None, :, None] * dz[None, None, :]).astype(np.int32)
+        self.placements.append((item.id, x, y, z, w, h, d))
+
+    def copy(self):
+        """Return an independent copy of this container"""
+        clone = SummedVolumeContainer.__new__(SummedVolumeContainer)
+        clone.w, clone.h, clone.d = self.w, self.h, self.d
+        clone.placements = list(self.placements)
+        clone.table = self.table.copy()
+        return clone
+
+    def nbytes(self):
+        """Approximate memory held by this container, in bytes"""
+        return self.table.nbytes + 64 * len(self.placements)
+
+    def get_utilization(self):
+        total_volume = self.w * self.h * self.d
+        used_volume = int(self.table[-1, -1, -1])
+        return (used_volume / total_volume) * 100
@@ -1,72 +1,240 @@
-from Optimizer import *
-from flask import Flask, request, jsonify
+import json
+import sqlite3
+import time
+from contextlib import ExitStack
+from Admission import *
+from Jobs import *
+from Pipeline import *
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 
 
 app = Flask(__name__)
+job_store = JobStore()
+result_cache = ResultCache()
+
+# Pick up jobs orphaned by a server process that was killed or recycled
+for job_id in job_store.recover():
+    submit_job(job_store, job_id)
+
+
+@app.before_request
+def start_timer():
+    g.start_time = time.time()
+
+
+@app.after_request
+def record_latency(response):
+    # Streaming responses are timed until their headers are sent
+    if request.url_rule is not None and request.endpoint != "metrics":
+        labels = {"route": request.url_rule.rule, "method": request.method,
+                  "status": response.status_code}
+        try:
+            default_store().record(observations=[
+                ("optimizer_request_seconds", labels, time.time() - g.start_time)])
+        except sqlite3.Error as e:
+            print(f"Could not record metrics: {e}")
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics summed over every worker process."""
+    return Response(default_store().render(), mimetype="text/plain; version=0.0.4")
+
+
+def request_data():
+    """Parse the JSON request body, if any."""
+    body = request.get_data()
+    if not body:
+        return None
+    try:
+        return loads(body)
+    except ValueError:
+        raise RequestError("Invalid JSON")
+
+
+def result_response(result, config=None):
+    """Respond with a result, its placements in the format the client asked for."""
+    format = response_format(request.accept_mimetypes.values(), config)
+    return Response(dumps(encode_result(result, format)), mimetype=RESPONSE_FORMATS[format])
+
+
+def admission_error(e):
+    """Respond to a refused request with the cost estimate it was refused on."""
+    headers = {} if e.retry_after is None else {"Retry-After": str(e.retry_after)}
+    return jsonify({"status": "error", "message": str(e), "estimate": e.estimate}), e.status, headers
 
 
 @app.route('/optimize', methods=['POST'])
 def optimize():
     try:
-        data = request.get_json()
-
-        # Validate request
-        if not data:
-            return jsonify({"status": "error", "message": "No data provided"}), 400
-
-        if "container" not in data or "items" not in data:
-            return jsonify({"status": "error", "message": "Missing container or items data"}), 400
-
-        container = data["container"]
-        if "width" not in container or "height" not in container or "depth" not in container:
-            return jsonify({"status": "error", "message": "Container dimensions not specified"}), 400
-
-        # Ensure that the container dimensions are integers
-        container['width'] = int(container['width'])
-        container['height'] = int(container['height'])
-        container['depth'] = int(container['depth'])
-
-        items = data["items"]
-        if not items or not isinstance(items, list):
-            return jsonify({"status": "error", "message": "No items provided or invalid items format"}), 400
-
-        for item in items:
-            if "dimensions" not in item:
-                return jsonify({"status": "error", "message": "Item missing dimensions"}), 400
-            dim = item["dimensions"]
-            if "width" not in dim or "height" not in dim or "depth" not in dim:
-                return jsonify({"status": "error", "message": "Item dimensions incomplete"}), 400
-
-            # Ensure item dimensions are integers
-            dim['width'] = int(dim['width'])
-            dim['height'] = int(dim['height'])
-            dim['depth'] = int(dim['depth'])
-
-        # Optional configuration
-        config = data.get("config", None)
-
-        # Set default values if config is None or contains invalid/empty values
-        if not config or not isinstance(config, dict):
-            config = {
-                "population_size": 30,
-                "generations": 50
-            }
-        else:
-            config["population_size"] = int(
-                config.get("population_size", 30) or 30)
-            config["generations"] = int(config.get("generations", 50) or 50)
-
-        optimizer = Optimizer(container, items)
-
-        # Perform optimization
-        result = optimizer.genetic_algorithm(
-            config["population_size"], config["generations"])
-
-        return jsonify(result)
+        try:
+            container, items, config = parse_request(request_data())
+            estimate, downgrades = admit(container, items, config)
+        except AdmissionError as e:
+            return admission_error(e)
+        except RequestError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
+
+        # Return the result of an identical earlier request, or perform optimization
+        # once a slot for requests of this size is free
+        try:
+            result = run_cached_optimization(container, items, config, result_cache,
+                                             lambda: size_class_slot(estimate))
+        except AdmissionError as e:
+            return admission_error(e)
+        result["stats"]["admission"] = dict(estimate, downgrades=downgrades)
+
+        return result_response(result, config)
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/repack', methods=['POST'])
+def repack():
+    """Update a previous result for added and removed items, moving as little as possible."""
+    try:
+        try:
+            container, placements, added, removed, config = parse_repack_request(request_data())
+            # Besides the added items the GA may move up to neighbourhood placed ones
+            moved = [{"id": placement[0], "dimensions": dict(zip(("width", "height", "depth"), placement[4:]))}
+                     for placement in placements[:config["neighbourhood"]]]
+            estimate, downgrades = admit(container, added + moved, config)
+        except AdmissionError as e:
+            return admission_error(e)
+        except RequestError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
+
+        try:
+            with size_class_slot(estimate):
+                result = run_repack(container, placements, added, removed, config)
+        except AdmissionError as e:
+            return admission_error(e)
+        result["stats"]["admission"] = dict(estimate, downgrades=downgrades)
+
+        return result_response(result, config)
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/optimize/batch', methods=['POST'])
+def optimize_batch():
+    """Solve many problems, streaming one NDJSON result line per problem as each finishes."""
+    if request.mimetype == "application/x-ndjson":
+        # One problem per line, read as the results stream out
+        problems = (line for line in request.stream if line.strip())
+    else:
+        try:
+            data = request_data()
+        except RequestError:
+            data = None
+        problems = data.get("problems") if isinstance(data, dict) else data
+        if not isinstance(problems, list):
+            return jsonify({"status": "error", "message": "Expected a list of problems"}), 400
+
+    # A batch keeps every core busy, so it takes a slot of the large size class
+    # until its response is closed
+    slot = ExitStack()
+    try:
+        slot.enter_context(size_class_slot({"size_class": "large", "seconds": MAX_SECONDS}))
+    except AdmissionError as e:
+        return admission_error(e)
+
+    def stream():
+        for result in solve_batch(problems, BATCH_WORKERS, result_cache.path, admit):
+            yield dumps(result) + b"\n"
+
+    response = Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+    response.call_on_close(slot.close)
+    return response
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        try:
+            container, items, config = parse_request(request_data())
+            estimate, downgrades = admit(container, items, config)
+        except AdmissionError as e:
+            return admission_error(e)
+        except RequestError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
+
+        job_id = job_store.create({"container": container, "items": items, "config": config,
+                                   "estimate": estimate})
+        submit_job(job_store, job_id)
+
+        return jsonify({"status": "queued", "job_id": job_id,
+                        "admission": dict(estimate, downgrades=downgrades)}), \
+            202, {"Location": f"/jobs/{job_id}"}
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    response = {"job_id": job_id, "status": job["status"]}
+    format = response_format(request.accept_mimetypes.values(), job["request"]["config"])
+    # Best placements found so far while the job runs, the full result once it ends
+    if job["best"] is not None:
+        response["best"] = encode_result(job["best"], format)
+    if job["result"] is not None:
+        response["result"] = encode_result(job["result"], format)
+    if job["error"] is not None:
+        response["message"] = job["error"]
+    return jsonify(response)
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    job_store.request_cancel(job_id)
+    job = job_store.get(job_id)
+    if job["status"] == "running":
+        return jsonify({"job_id": job_id, "status": "cancelling"}), 202
+    return jsonify({"job_id": job_id, "status": job["status"]})
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream per-generation progress as Server-Sent Events until the job ends."""
+    if job_store.get(job_id) is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    # Reconnecting clients resume after the last event they saw
+    last_seq = int(request.headers.get("Last-Event-ID", 0) or 0)
+
+    def stream(seq):
+        last_sent = time.time()
+        while True:
+            # Read the status first so no event recorded before the job ended is missed
+            status = job_store.get(job_id)["status"]
+            for seq, data in job_store.events_since(job_id, seq):
+                yield f"id: {seq}\nevent: progress\ndata: {data}\n\n"
+                last_sent = time.time()
+
+            if status in FINISHED_STATUSES:
+                yield f"event: {status}\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+                return
+
+            # Comment lines keep idle proxies from closing the stream
+            if time.time() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            time.sleep(0.5)
+
+    return Response(stream_with_context(stream(last_seq)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,48 @@
+"""Solve a JSONL file of packing problems offline, writing one JSON result per line.
+
+Each input line has the same shape as a POST /optimize body. Results are
+written as they finish, tagged with the index (and id, if given) of their
+problem, e.g.
+
+    python batch.py orders.jsonl -o results.jsonl
+"""
+import argparse
+import os
+import sys
+from Admission import *
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a JSONL file of packing problems.")
+    parser.add_argument("input", help="JSONL file of problems, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for results (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes to solve problems on (default: all cores)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse and store results in the server's result cache")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    failed = 0
+    try:
+        problems = (line for line in source if line.strip())
+        for result in solve_batch(problems, max(1, args.workers),
+                                  RESULTS_DB if args.cache else None, admit):
+            failed += result["status"] == "error"
+            output.write(dumps(result).decode() + "\n")
+            output.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if failed:
+        print(f"{failed} problem(s) failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
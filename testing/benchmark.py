@@ -0,0 +1,151 @@
+"""In-process benchmark of the optimizer on generated 3D packing instances.
+
+Instances follow the Bischoff & Ratcliff generator: a 587 x 233 x 220
+container and box types with sides drawn from [30, 120] x [25, 100] x [20, 80],
+scaled down by a factor per size. Weakly heterogeneous instances have few box
+types with many boxes each, strongly heterogeneous ones many types with few
+boxes. Every run uses a fixed seed, so utilization is reproducible and only
+the timings vary between machines.
+
+    python testing/benchmark.py                      # run and compare to the baseline
+    python testing/benchmark.py --save-baseline      # run and store a new baseline
+    python testing/benchmark.py --config '{"placement": "extreme_points"}'
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Pipeline import *
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "benchmark_results.json")
+BASELINE_FILE = os.path.join(HERE, "benchmark_baseline.json")
+
+CONTAINER = (587, 233, 220)
+BOX_RANGES = ((30, 120), (25, 100), (20, 80))
+
+# name -> (box types, scale divisor)
+INSTANCES = {
+    "weak-small": (3, 10),
+    "mixed-small": (8, 10),
+    "strong-small": (20, 10),
+    "weak-medium": (3, 6),
+    "mixed-medium": (8, 6),
+    "strong-medium": (20, 6),
+}
+
+# Heuristics are off so every run spends its time in the GA being measured, and
+# extreme points keep a full run to a few minutes
+DEFAULT_CONFIG = {"population_size": 30, "generations": 20, "seed": 0, "heuristics": False,
+                  "placement": "extreme_points"}
+
+# Allowed change before a metric counts as a regression
+TIME_TOLERANCE = 0.25  # fraction of the baseline evaluations per second
+UTILIZATION_TOLERANCE = 0.5  # percentage points
+
+
+def generate_instance(types, scale, seed=0):
+    """Generate a Bischoff & Ratcliff style request with boxes for nearly all of the volume."""
+    rng = random.Random(seed)
+    w, h, d = (max(1, side // scale) for side in CONTAINER)
+    box_types = [tuple(max(1, rng.randint(low, high) // scale) for low, high in BOX_RANGES)
+                 for _ in range(types)]
+
+    items, volume = [], 0
+    while True:
+        bw, bh, bd = rng.choice(box_types)
+        # Past the full container volume no arrangement could be evaluated at all
+        if volume + bw * bh * bd > w * h * d:
+            break
+        items.append({"id": len(items), "dimensions": {"width": bw, "height": bh, "depth": bd}})
+        volume += bw * bh * bd
+    return {"container": {"width": w, "height": h, "depth": d}, "items": items}
+
+
+def run_instance(data, config):
+    """Optimize one request, returning its metrics."""
+    container, items, config = parse_request(dict(data, config=dict(config)))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run_optimization(container, items, config)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = result["stats"]
+    return {
+        "items": len(items),
+        "seconds": round(seconds, 3),
+        "evaluations": stats["evaluations"],
+        "evaluations_per_second": round(stats["evaluations"] / seconds, 1),
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+        "utilization": result["space_utilization"],
+        "stop_reason": stats["stop_reason"],
+    }
+
+
+def compare(results, baseline):
+    """Return a message for every instance that got slower or packs worse than the baseline."""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if metrics["evaluations_per_second"] < base["evaluations_per_second"] * (1 - TIME_TOLERANCE):
+            regressions.append(f"{name}: {metrics['evaluations_per_second']} evaluations/s, "
+                               f"baseline {base['evaluations_per_second']}")
+        if metrics["utilization"] < base["utilization"] - UTILIZATION_TOLERANCE:
+            regressions.append(f"{name}: {metrics['utilization']}% utilization, "
+                               f"baseline {base['utilization']}%")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the optimizer on generated instances.")
+    parser.add_argument("--config", default="{}", help="JSON config merged over the defaults")
+    parser.add_argument("--instances", nargs="*", choices=sorted(INSTANCES),
+                        help="instances to run (default: all)")
+    parser.add_argument("--output", default=RESULTS_FILE, help="file to write the results to")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+
+    config = dict(DEFAULT_CONFIG, **json.loads(args.config))
+    results = {}
+    for name in args.instances or INSTANCES:
+        types, scale = INSTANCES[name]
+        results[name] = run_instance(generate_instance(types, scale), config)
+        metrics = results[name]
+        print(f"{name:14} {metrics['items']:4} items  {metrics['seconds']:8.2f}s  "
+              f"{metrics['evaluations_per_second']:8.1f} eval/s  "
+              f"{metrics['peak_memory_mb']:7.2f} MB  {metrics['utilization']:6.2f}%")
+
+    report = {"config": config, "python": sys.version.split()[0], "instances": results}
+    with open(args.baseline if args.save_baseline else args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print("Baseline was recorded with a different config; skipping comparison")
+        return 0
+    regressions = compare(results, baseline["instances"])
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())